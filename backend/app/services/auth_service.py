@@ -6,6 +6,7 @@ Implements comprehensive authentication flow with tenant isolation and audit log
 import asyncio
 import hashlib
 from datetime import datetime, timedelta
+from enum import Enum
 from typing import Dict, List, Optional, Tuple
 from uuid import UUID, uuid4
 
@@ -27,6 +28,15 @@ from app.models.auth import (
 )
 
 
+class AuthErrorCode(str, Enum):
+    """Machine-readable reasons for a failed login."""
+    INVALID_CREDENTIALS = "invalid_credentials"
+    RATE_LIMITED = "rate_limited"
+    ACCOUNT_INACTIVE = "account_inactive"
+    ACCOUNT_LOCKED = "account_locked"
+    INVALID_MFA = "invalid_mfa"
+
+
 class LoginRequest(BaseModel):
     """Login request model."""
     email: str
@@ -43,6 +53,7 @@ class LoginResult(BaseModel):
     requires_mfa: bool = False
     mfa_methods: List[str] = []
     error: Optional[str] = None
+    error_code: Optional[AuthErrorCode] = None
     user_id: Optional[str] = None
     tenant_id: Optional[str] = None
 
@@ -96,7 +107,8 @@ class AuthenticationService:
             )
             return LoginResult(
                 success=False,
-                error="Too many login attempts. Please try again later."
+                error="Too many login attempts. Please try again later.",
+                error_code=AuthErrorCode.RATE_LIMITED
             )
         
         # Step 2: Get user profile
@@ -113,7 +125,8 @@ class AuthenticationService:
             await self._add_delay_for_failed_attempt(device_info.ip_address)
             return LoginResult(
                 success=False,
-                error="Invalid email or password."
+                error="Invalid email or password.",
+                error_code=AuthErrorCode.INVALID_CREDENTIALS
             )
         
         # Step 3: Check account status
@@ -128,7 +141,8 @@ class AuthenticationService:
             )
             return LoginResult(
                 success=False,
-                error=f"Account is {user_profile.auth_status}. Please contact support."
+                error=f"Account is {user_profile.auth_status}. Please contact support.",
+                error_code=AuthErrorCode.ACCOUNT_INACTIVE
             )
         
         # Step 4: Check account lockout
@@ -143,15 +157,20 @@ class AuthenticationService:
             )
             return LoginResult(
                 success=False,
-                error="Account is temporarily locked due to multiple failed attempts."
+                error="Account is temporarily locked due to multiple failed attempts.",
+                error_code=AuthErrorCode.ACCOUNT_LOCKED
             )
         
-        # Step 5: Verify password
-        if not security.verify_password(login_request.password, user_profile.password_hash):
+        # Step 5: Verify password (hashing is CPU-bound, keep it off the event loop)
+        password_valid = await asyncio.to_thread(
+            security.verify_password, login_request.password, user_profile.password_hash
+        )
+        if not password_valid:
             await self._handle_failed_login(user_profile, device_info, login_request.email)
             return LoginResult(
                 success=False,
-                error="Invalid email or password."
+                error="Invalid email or password.",
+                error_code=AuthErrorCode.INVALID_CREDENTIALS
             )
         
         # Step 6: Check MFA requirement
@@ -170,7 +189,8 @@ class AuthenticationService:
                 await self._handle_failed_login(user_profile, device_info, login_request.email)
                 return LoginResult(
                     success=False,
-                    error="Invalid MFA code."
+                    error="Invalid MFA code.",
+                    error_code=AuthErrorCode.INVALID_MFA
                 )
         
         # Step 7: Check device trust
@@ -21,7 +21,6 @@ from decimal import Decimal, ROUND_HALF_UP
 from typing import Dict, List, Optional, Set, Tuple, Any
 from uuid import UUID
 import json
-import concurrent.futures
 from dataclasses import dataclass
 
 import pandas as pd
@@ -431,9 +430,15 @@ class MatchingEngine:
         self, 
         invoice_ids: List[UUID], 
         db: AsyncSession,
-        parallel: bool = True
+        parallel: bool = True,
+        concurrency: int = 4
     ) -> ProcessingMetrics:
-        """Process a batch of invoices for matching."""
+        """
+        Process a batch of invoices for matching.
+        
+        With ``parallel`` set, invoices are split into batches of 10 and up to
+        ``concurrency`` batches are matched at once, each on its own session.
+        """
         start_time = datetime.now()
         
         logger.info(f"Starting batch matching for {len(invoice_ids)} invoices")
@@ -442,16 +447,18 @@ class MatchingEngine:
         if parallel and len(invoice_ids) > 1:
             # Process in parallel batches
             batch_size = 10  # Configurable
-            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-                futures = []
-                for i in range(0, len(invoice_ids), batch_size):
-                    batch = invoice_ids[i:i + batch_size]
-                    future = executor.submit(self._process_invoice_batch, batch, db)
-                    futures.append(future)
-                
-                for future in concurrent.futures.as_completed(futures):
-                    batch_results = future.result()
-                    results.extend(batch_results)
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+            
+            async def run_batch(batch: List[UUID]) -> List[Optional[MatchDecision]]:
+                async with semaphore:
+                    return await self._process_invoice_batch(batch, db)
+            
+            batch_results = await asyncio.gather(*(
+                run_batch(invoice_ids[i:i + batch_size])
+                for i in range(0, len(invoice_ids), batch_size)
+            ))
+            for batch_result in batch_results:
+                results.extend(batch_result)
         else:
             # Sequential processing
             for invoice_id in invoice_ids:
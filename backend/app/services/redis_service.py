@@ -30,6 +30,8 @@ class RedisService:
     def __init__(self):
         self.redis_client: Optional[redis.Redis] = None
         self.connection_pool: Optional[redis.ConnectionPool] = None
+        # Prepended to every key this service builds, e.g. to isolate tests
+        self.key_prefix = ""
     
     async def connect(self):
         """Initialize Redis connection pool."""
@@ -83,7 +85,7 @@ class RedisService:
         if not self.redis_client:
             return True  # Allow if Redis is unavailable
         
-        rate_key = f"rate_limit:{key}"
+        rate_key = f"{self.key_prefix}rate_limit:{key}"
         current_time = datetime.utcnow().timestamp()
         window_start = current_time - window
         
@@ -136,7 +138,7 @@ class RedisService:
                 reset_time=datetime.utcnow() + timedelta(seconds=window)
             )
         
-        rate_key = f"rate_limit:{key}"
+        rate_key = f"{self.key_prefix}rate_limit:{key}"
         current_time = datetime.utcnow().timestamp()
         window_start = current_time - window
         
@@ -171,7 +173,7 @@ class RedisService:
         if not self.redis_client:
             return 0.0
         
-        delay_key = f"progressive_delay:{key}"
+        delay_key = f"{self.key_prefix}progressive_delay:{key}"
         
         try:
             # Get current attempt count
@@ -206,9 +208,26 @@ class RedisService:
         if not self.redis_client:
             return
         
-        blacklist_key = f"blacklisted_token:{token}"
+        blacklist_key = f"{self.key_prefix}blacklisted_token:{token}"
         await self.redis_client.setex(blacklist_key, expires_in, "1")
     
+    async def blacklist_tokens(self, tokens: List[str], expires_in: int = 3600):
+        """
+        Add multiple tokens to blacklist in a single round trip.
+        
+        Args:
+            tokens: JWT tokens to blacklist
+            expires_in: Expiration time in seconds
+        """
+        if not self.redis_client or not tokens:
+            return
+        
+        pipe = self.redis_client.pipeline(transaction=False)
+        for token in tokens:
+            pipe.setex(f"{self.key_prefix}blacklisted_token:{token}", expires_in, "1")
+        
+        await pipe.execute()
+    
     async def is_token_blacklisted(self, token: str) -> bool:
         """
         Check if token is blacklisted.
@@ -222,7 +241,7 @@ class RedisService:
         if not self.redis_client:
             return False
         
-        blacklist_key = f"blacklisted_token:{token}"
+        blacklist_key = f"{self.key_prefix}blacklisted_token:{token}"
         result = await self.redis_client.get(blacklist_key)
         return result is not None
     
@@ -245,7 +264,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        session_key = f"session:{session_id}"
+        session_key = f"{self.key_prefix}session:{session_id}"
         await self.redis_client.setex(
             session_key,
             expires_in,
@@ -265,7 +284,7 @@ class RedisService:
         if not self.redis_client:
             return None
         
-        session_key = f"session:{session_id}"
+        session_key = f"{self.key_prefix}session:{session_id}"
         session_data = await self.redis_client.get(session_key)
         
         if session_data:
@@ -286,7 +305,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        session_key = f"session:{session_id}"
+        session_key = f"{self.key_prefix}session:{session_id}"
         await self.redis_client.delete(session_key)
     
     async def extend_session(self, session_id: str, extends_by: int = 3600):
@@ -300,7 +319,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        session_key = f"session:{session_id}"
+        session_key = f"{self.key_prefix}session:{session_id}"
         await self.redis_client.expire(session_key, extends_by)
     
     async def get_user_sessions(self, user_id: Union[str, UUID]) -> List[str]:
@@ -316,7 +335,7 @@ class RedisService:
         if not self.redis_client:
             return []
         
-        user_sessions_key = f"user_sessions:{user_id}"
+        user_sessions_key = f"{self.key_prefix}user_sessions:{user_id}"
         session_ids = await self.redis_client.smembers(user_sessions_key)
         return list(session_ids) if session_ids else []
     
@@ -331,7 +350,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        user_sessions_key = f"user_sessions:{user_id}"
+        user_sessions_key = f"{self.key_prefix}user_sessions:{user_id}"
         await self.redis_client.sadd(user_sessions_key, session_id)
         await self.redis_client.expire(user_sessions_key, 86400)  # 24 hours
     
@@ -346,7 +365,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        user_sessions_key = f"user_sessions:{user_id}"
+        user_sessions_key = f"{self.key_prefix}user_sessions:{user_id}"
         await self.redis_client.srem(user_sessions_key, session_id)
     
     # Caching Methods
@@ -370,7 +389,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        cache_key = f"{namespace}:{key}"
+        cache_key = f"{self.key_prefix}{namespace}:{key}"
         serialized_value = json.dumps(value, default=str)
         await self.redis_client.setex(cache_key, expires_in, serialized_value)
     
@@ -392,7 +411,7 @@ class RedisService:
         if not self.redis_client:
             return None
         
-        cache_key = f"{namespace}:{key}"
+        cache_key = f"{self.key_prefix}{namespace}:{key}"
         cached_value = await self.redis_client.get(cache_key)
         
         if cached_value:
@@ -418,7 +437,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        cache_key = f"{namespace}:{key}"
+        cache_key = f"{self.key_prefix}{namespace}:{key}"
         await self.redis_client.delete(cache_key)
     
     async def delete_cache_pattern(
@@ -436,7 +455,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        search_pattern = f"{namespace}:{pattern}"
+        search_pattern = f"{self.key_prefix}{namespace}:{pattern}"
         keys = []
         
         async for key in self.redis_client.scan_iter(match=search_pattern):
@@ -464,7 +483,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        block_key = f"blocked_ip:{ip_address}"
+        block_key = f"{self.key_prefix}blocked_ip:{ip_address}"
         block_data = {
             "blocked_at": datetime.utcnow().isoformat(),
             "reason": reason
@@ -488,7 +507,7 @@ class RedisService:
         if not self.redis_client:
             return False
         
-        block_key = f"blocked_ip:{ip_address}"
+        block_key = f"{self.key_prefix}blocked_ip:{ip_address}"
         result = await self.redis_client.get(block_key)
         return result is not None
     
@@ -502,7 +521,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        block_key = f"blocked_ip:{ip_address}"
+        block_key = f"{self.key_prefix}blocked_ip:{ip_address}"
         await self.redis_client.delete(block_key)
     
     # Device Fingerprinting
@@ -526,7 +545,7 @@ class RedisService:
         if not self.redis_client:
             return
         
-        device_key = f"device_attempts:{device_fingerprint}"
+        device_key = f"{self.key_prefix}device_attempts:{device_fingerprint}"
         attempt_data = {
             "timestamp": datetime.utcnow().isoformat(),
             "ip_address": ip_address,
@@ -555,7 +574,7 @@ class RedisService:
         if not self.redis_client:
             return []
         
-        device_key = f"device_attempts:{device_fingerprint}"
+        device_key = f"{self.key_prefix}device_attempts:{device_fingerprint}"
         attempts = await self.redis_client.lrange(device_key, 0, -1)
         
         parsed_attempts = []
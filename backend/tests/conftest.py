@@ -0,0 +1,28 @@
+"""
+Shared fixtures for the backend test suites
+"""
+
+import pytest
+
+from app.services.redis_service import redis_service
+
+
+@pytest.fixture(scope="module")
+async def redis_connection():
+    """
+    Connect the Redis service for tests that depend on rate limiting.
+    
+    Module-scoped, so a requesting module must provide a module-scoped
+    event_loop for the connection to live on.
+    """
+    # The app lifespan normally opens the connection; tests run without it
+    connected_here = redis_service.redis_client is None
+    if connected_here:
+        await redis_service.connect()
+    
+    yield redis_service.redis_client
+    
+    if connected_here:
+        await redis_service.disconnect()
+        redis_service.redis_client = None
+        redis_service.connection_pool = None
\ No newline at end of file
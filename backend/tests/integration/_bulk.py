@@ -0,0 +1,74 @@
+"""
+Bulk seeding helpers for integration and load tests
+Loads rows with PostgreSQL COPY instead of one ORM INSERT per row
+"""
+
+from typing import Iterable, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.auth import UserProfile
+
+
+USER_PROFILE_COLUMNS = (
+    "id",
+    "tenant_id",
+    "email",
+    "password_hash",
+    "full_name",
+    "auth_status",
+    "mfa_enabled",
+)
+
+
+async def bulk_copy(
+    session: AsyncSession,
+    table: str,
+    rows: Iterable[Sequence],
+    columns: Sequence[str]
+) -> int:
+    """
+    Copy rows into a table in a single COPY command.
+    
+    The COPY runs on the session's own asyncpg connection, so the rows are
+    part of the session transaction and become visible on commit.
+    
+    Args:
+        session: Database session to seed through
+        table: Name of the table to copy into
+        rows: Tuples of values ordered like ``columns``
+        columns: Table columns present in each row
+        
+    Returns:
+        Number of rows copied
+    """
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    
+    status = await raw_connection.driver_connection.copy_records_to_table(
+        table,
+        records=list(rows),
+        columns=list(columns)
+    )
+    
+    # asyncpg returns the command tag, e.g. "COPY 20"
+    return int(status.split()[-1])
+
+
+async def bulk_seed_users(
+    session: AsyncSession,
+    rows: Iterable[Sequence],
+    columns: Sequence[str] = USER_PROFILE_COLUMNS
+) -> int:
+    """
+    Copy user profile rows into the database in a single COPY command.
+    
+    Args:
+        session: Database session to seed through
+        rows: Tuples of values ordered like ``columns``
+        columns: user_profiles columns present in each row
+        
+    Returns:
+        Number of rows copied
+    """
+    return await bulk_copy(session, UserProfile.__tablename__, rows, columns)
\ No newline at end of file
@@ -5,21 +5,71 @@ Tests full authentication flows with real database and Redis connections
 
 import pytest
 import asyncio
-from datetime import datetime, timedelta
-from uuid import uuid4
+import time
+from datetime import datetime, timedelta, timezone
+from uuid import UUID, uuid4
 import pyotp
-from httpx import AsyncClient
+from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, insert, delete, func
 
 from app.main import app
 from app.core.config import settings
-from app.core.database import get_db
-from app.models.auth import UserProfile, Role, UserRole, UserSession, AuthAttempt, PasswordResetToken
+from app.core.database import get_db, get_db_context
+from app.models.auth import (
+    UserProfile, Role, UserRole, UserSession, AuthAttempt, PasswordResetToken, SecurityAuditLog
+)
 from app.services.auth_service import AuthenticationService, LoginRequest, DeviceInfo
 from app.services.redis_service import redis_service
 from app.core.security import security
 
+from tests.integration._bulk import bulk_seed_users
+
+
+# Fixed tenant IDs keep query parameters stable across runs. Tests purge
+# their tenants both before seeding and in teardown, so rows left behind by
+# an interrupted run cannot collide with the next one
+TEST_TENANT_ID = UUID("00000000-0000-0000-0000-000000000001")
+TENANT_A_ID = UUID("00000000-0000-0000-0000-00000000000a")
+TENANT_B_ID = UUID("00000000-0000-0000-0000-00000000000b")
+
+
+async def purge_tenants(session: AsyncSession, *tenant_ids: UUID) -> None:
+    """Delete every user and role seeded under the given tenants"""
+    # A failed test can leave the session mid-transaction
+    await session.rollback()
+    
+    # Auth attempts and audit log rows reference users without ON DELETE
+    # CASCADE, so they go first; sessions, reset tokens and role
+    # assignments cascade with their user or role
+    users = select(UserProfile.id).where(UserProfile.tenant_id.in_(tenant_ids))
+    await session.execute(delete(AuthAttempt).where(AuthAttempt.user_id.in_(users)))
+    await session.execute(delete(SecurityAuditLog).where(SecurityAuditLog.user_id.in_(users)))
+    await session.execute(delete(Role).where(Role.tenant_id.in_(tenant_ids)))
+    await session.execute(delete(UserProfile).where(UserProfile.tenant_id.in_(tenant_ids)))
+    await session.commit()
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    """Module-wide event loop so the shared API client outlives a single test"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+async def test_client():
+    """In-process ASGI client shared by every API test in this module"""
+    transport = ASGITransport(app=app)
+    async with AsyncClient(
+        transport=transport,
+        base_url="http://testserver",
+        follow_redirects=False,
+        http2=False
+    ) as client:
+        yield client
+
 
 @pytest.mark.integration
 class TestAuthenticationIntegration:
@@ -31,34 +81,33 @@ class TestAuthenticationIntegration:
         async for session in get_db():
             yield session
     
-    @pytest.fixture
-    async def test_client(self):
-        """Get test client"""
-        async with AsyncClient(app=app, base_url="http://testserver") as client:
-            yield client
-    
     @pytest.fixture
     async def test_user(self, db_session: AsyncSession):
         """Create test user for integration tests"""
         # Create tenant first (simplified - would need proper tenant creation)
-        tenant_id = uuid4()
+        tenant_id = TEST_TENANT_ID
+        now = datetime.now(timezone.utc)
+        await purge_tenants(db_session, tenant_id)
         
-        user = UserProfile(
-            id=uuid4(),
-            tenant_id=tenant_id,
-            email="test@integration.com",
-            password_hash=security.hash_password("TestPassword123!"),
-            full_name="Integration Test User",
-            auth_status="active",
-            mfa_enabled=False,
-            created_at=datetime.utcnow()
+        # INSERT ... RETURNING hands back the fully populated row, server
+        # defaults included, without a follow-up refresh SELECT
+        result = await db_session.execute(
+            insert(UserProfile).returning(UserProfile),
+            [{
+                "id": uuid4(),
+                "tenant_id": tenant_id,
+                "email": "test@integration.com",
+                "password_hash": security.hash_password("TestPassword123!"),
+                "full_name": "Integration Test User",
+                "auth_status": "active",
+                "mfa_enabled": False,
+                "created_at": now
+            }]
         )
+        user = result.scalar_one()
         
-        db_session.add(user)
-        await db_session.commit()
-        await db_session.refresh(user)
-        
-        # Create basic role
+        # Create basic role in the same transaction; IDs are assigned
+        # client-side, so nothing needs committing before it is linked
         role = Role(
             id=uuid4(),
             tenant_id=tenant_id,
@@ -69,7 +118,7 @@ class TestAuthenticationIntegration:
                 "vendors": ["read"]
             },
             is_active=True,
-            created_at=datetime.utcnow()
+            created_at=now
         )
         
         db_session.add(role)
@@ -81,7 +130,7 @@ class TestAuthenticationIntegration:
             tenant_id=tenant_id,
             assigned_by=user.id,
             is_active=True,
-            created_at=datetime.utcnow()
+            created_at=now
         )
         
         db_session.add(user_role)
@@ -90,10 +139,7 @@ class TestAuthenticationIntegration:
         yield user
         
         # Cleanup
-        await db_session.execute(delete(UserRole).where(UserRole.user_id == user.id))
-        await db_session.execute(delete(Role).where(Role.id == role.id))
-        await db_session.execute(delete(UserProfile).where(UserProfile.id == user.id))
-        await db_session.commit()
+        await purge_tenants(db_session, tenant_id)
     
     @pytest.fixture
     def device_info(self):
@@ -150,8 +196,7 @@ class TestAuthenticationIntegration:
             select(UserSession).where(UserSession.user_id == test_user.id)
         )
         sessions = result.scalars().all()
-        for session in sessions:
-            assert session.status == 'revoked'
+        assert all(session.status == 'revoked' for session in sessions)
     
     @pytest.mark.asyncio
     async def test_mfa_authentication_flow(self, db_session: AsyncSession, test_user, device_info):
@@ -165,9 +210,13 @@ class TestAuthenticationIntegration:
         assert mfa_result.qr_code.startswith("data:image/png;base64,")
         assert len(mfa_result.backup_codes) == settings.MFA_BACKUP_CODES_COUNT
         
-        # Generate valid TOTP code
+        # Precompute codes for the current and next TOTP windows up front;
+        # both are accepted (valid_window=1) and they can never collide the
+        # way two back-to-back totp.now() calls can
         totp = pyotp.TOTP(mfa_result.secret)
-        verification_code = totp.now()
+        now = datetime.now(timezone.utc)
+        codes = [totp.at(now + timedelta(seconds=totp.interval * i)) for i in range(2)]
+        verification_code = codes[0]
         
         # Enable MFA
         enable_success = await auth_service.enable_mfa(
@@ -191,8 +240,7 @@ class TestAuthenticationIntegration:
         assert "totp" in result.mfa_methods
         
         # Test login with valid MFA token
-        new_code = totp.now()
-        login_request.mfa_token = new_code
+        login_request.mfa_token = codes[1]
         
         result = await auth_service.authenticate_user(login_request, device_info)
         
@@ -214,12 +262,23 @@ class TestAuthenticationIntegration:
         assert remaining_codes == settings.MFA_BACKUP_CODES_COUNT - 1
     
     @pytest.mark.asyncio
-    async def test_rate_limiting_integration(self, db_session: AsyncSession, test_user, device_info):
+    async def test_rate_limiting_integration(
+        self, db_session: AsyncSession, test_user, device_info, redis_connection, monkeypatch
+    ):
         """Test rate limiting with Redis"""
+        # Every attempt here is meant to fail; skip bcrypt since password
+        # verification is covered by the happy-path tests
+        monkeypatch.setattr(security, "verify_password", lambda *args, **kwargs: False)
+        
         auth_service = AuthenticationService(db_session)
         
-        # Clear any existing rate limits
-        await redis_service.client.delete(f"login_ip:{device_info.ip_address}")
+        # Clear any existing rate limits and progressive delay
+        prefix = redis_service.key_prefix
+        await redis_connection.delete(
+            f"{prefix}rate_limit:login_ip:{device_info.ip_address}",
+            f"{prefix}rate_limit:login_email:{test_user.email}",
+            f"{prefix}progressive_delay:delay:{device_info.ip_address}"
+        )
         
         login_request = LoginRequest(
             email=test_user.email,
@@ -245,38 +304,39 @@ class TestAuthenticationIntegration:
     @pytest.mark.asyncio
     async def test_concurrent_session_limits(self, db_session: AsyncSession, test_user, device_info):
         """Test concurrent session management"""
-        auth_service = AuthenticationService(db_session)
-        
         login_request = LoginRequest(
             email=test_user.email,
             password="TestPassword123!"
         )
         
-        sessions = []
         max_sessions = settings.MAX_CONCURRENT_SESSIONS
         
-        # Create maximum allowed sessions
-        for i in range(max_sessions + 2):  # Create more than allowed
-            device_info_copy = DeviceInfo(
-                ip_address=device_info.ip_address,
-                user_agent=device_info.user_agent,
-                device_name=f"Device {i}",
-                fingerprint=f"device_{i}"
-            )
-            
-            result = await auth_service.authenticate_user(login_request, device_info_copy)
-            if result.success:
-                sessions.append(result.tokens)
+        async def authenticate(i: int):
+            # AsyncSession does not allow concurrent operations, so each
+            # in-flight login gets its own session from the pool
+            async with get_db_context() as session:
+                return await AuthenticationService(session).authenticate_user(
+                    login_request,
+                    DeviceInfo(
+                        ip_address=device_info.ip_address,
+                        user_agent=device_info.user_agent,
+                        device_name=f"Device {i}",
+                        fingerprint=f"device_{i}"
+                    )
+                )
+        
+        # Attempt more sessions than allowed, all at once
+        await asyncio.gather(*(authenticate(i) for i in range(max_sessions + 2)))
         
         # Verify only max_sessions are active
-        active_sessions = await db_session.execute(
-            select(UserSession).where(
+        active_sessions = await db_session.scalar(
+            select(func.count()).select_from(UserSession).where(
                 UserSession.user_id == test_user.id,
                 UserSession.status == 'active'
             )
         )
         
-        assert len(active_sessions.scalars().all()) <= max_sessions
+        assert active_sessions <= max_sessions
     
     @pytest.mark.asyncio
     async def test_password_reset_flow(self, db_session: AsyncSession, test_user, device_info):
@@ -286,12 +346,13 @@ class TestAuthenticationIntegration:
         # Create password reset token manually (simulating email flow)
         reset_token = security.generate_secure_token(32)
         token_hash = security.hash_password(reset_token)
+        now = datetime.now(timezone.utc)
         
         reset_token_record = PasswordResetToken(
             user_id=test_user.id,
             tenant_id=test_user.tenant_id,
             token_hash=token_hash,
-            expires_at=datetime.utcnow() + timedelta(minutes=30),
+            expires_at=now + timedelta(minutes=30),
             requested_ip=device_info.ip_address,
             requested_user_agent=device_info.user_agent
         )
@@ -310,7 +371,7 @@ class TestAuthenticationIntegration:
             .where(
                 PasswordResetToken.user_id == test_user.id,
                 PasswordResetToken.used_at == None,
-                PasswordResetToken.expires_at > datetime.utcnow()
+                PasswordResetToken.expires_at > now
             )
         )
         
@@ -322,7 +383,7 @@ class TestAuthenticationIntegration:
         # Update password
         new_hash = security.hash_password(new_password)
         user_profile.password_hash = new_hash
-        token_record.used_at = datetime.utcnow()
+        token_record.used_at = datetime.now(timezone.utc)
         
         await db_session.commit()
         
@@ -337,14 +398,14 @@ class TestAuthenticationIntegration:
         assert result.success is True
     
     @pytest.mark.asyncio
-    async def test_audit_logging_integration(self, db_session: AsyncSession, test_user, device_info):
+    async def test_audit_logging_integration(self, db_session: AsyncSession, test_user, device_info, monkeypatch):
         """Test that audit events are properly logged"""
         auth_service = AuthenticationService(db_session)
         
-        initial_count = await db_session.execute(
-            select(AuthAttempt).where(AuthAttempt.email == test_user.email)
+        attempt_count = select(func.count()).select_from(AuthAttempt).where(
+            AuthAttempt.email == test_user.email
         )
-        initial_attempts = len(initial_count.scalars().all())
+        initial_attempts = await db_session.scalar(attempt_count)
         
         # Successful login
         login_request = LoginRequest(
@@ -355,22 +416,26 @@ class TestAuthenticationIntegration:
         result = await auth_service.authenticate_user(login_request, device_info)
         assert result.success is True
         
-        # Failed login
+        # Failed login (wrong password is rejected without running bcrypt)
+        monkeypatch.setattr(security, "verify_password", lambda *args, **kwargs: False)
         login_request.password = "WrongPassword"
         result = await auth_service.authenticate_user(login_request, device_info)
         assert result.success is False
         
         # Check audit logs
-        final_count = await db_session.execute(
-            select(AuthAttempt).where(AuthAttempt.email == test_user.email)
-        )
-        final_attempts = final_count.scalars().all()
+        assert await db_session.scalar(attempt_count) == initial_attempts + 2
         
-        assert len(final_attempts) == initial_attempts + 2
+        # Verify audit log details on just the two new attempts
+        result = await db_session.execute(
+            select(AuthAttempt)
+            .where(AuthAttempt.email == test_user.email)
+            .order_by(AuthAttempt.attempted_at.desc())
+            .limit(2)
+        )
+        new_attempts = result.scalars().all()
         
-        # Verify audit log details
-        success_attempt = next((a for a in final_attempts if a.success), None)
-        failed_attempt = next((a for a in final_attempts if not a.success), None)
+        success_attempt = next((a for a in new_attempts if a.success), None)
+        failed_attempt = next((a for a in new_attempts if not a.success), None)
         
         assert success_attempt is not None
         assert success_attempt.ip_address == device_info.ip_address
@@ -383,58 +448,63 @@ class TestAuthenticationIntegration:
     async def test_multi_tenant_isolation(self, db_session: AsyncSession):
         """Test that tenant isolation works properly"""
         # Create users in different tenants
-        tenant1_id = uuid4()
-        tenant2_id = uuid4()
-        
-        user1 = UserProfile(
-            id=uuid4(),
-            tenant_id=tenant1_id,
-            email="user1@tenant1.com",
-            password_hash=security.hash_password("Password123!"),
-            full_name="Tenant 1 User",
-            auth_status="active"
-        )
-        
-        user2 = UserProfile(
-            id=uuid4(),
-            tenant_id=tenant2_id,
-            email="user2@tenant2.com",
-            password_hash=security.hash_password("Password123!"),
-            full_name="Tenant 2 User",
-            auth_status="active"
-        )
-        
-        db_session.add_all([user1, user2])
+        tenant1_id = TENANT_A_ID
+        tenant2_id = TENANT_B_ID
+        
+        user1 = {
+            "id": uuid4(),
+            "tenant_id": tenant1_id,
+            "email": "user1@tenant1.com",
+            "password_hash": security.hash_password("Password123!"),
+            "full_name": "Tenant 1 User",
+            "auth_status": "active"
+        }
+        
+        user2 = {
+            "id": uuid4(),
+            "tenant_id": tenant2_id,
+            "email": "user2@tenant2.com",
+            "password_hash": security.hash_password("Password123!"),
+            "full_name": "Tenant 2 User",
+            "auth_status": "active"
+        }
+        
+        await purge_tenants(db_session, tenant1_id, tenant2_id)
+        
+        # One INSERT statement with both parameter sets
+        await db_session.execute(insert(UserProfile), [user1, user2])
         await db_session.commit()
         
-        auth_service = AuthenticationService(db_session)
-        device_info = DeviceInfo(
-            ip_address="127.0.0.1",
-            user_agent="Test Client",
-            fingerprint="test_device"
-        )
-        
-        # Authenticate both users
-        login1 = LoginRequest(email=user1.email, password="Password123!")
-        result1 = await auth_service.authenticate_user(login1, device_info)
-        
-        login2 = LoginRequest(email=user2.email, password="Password123!")
-        result2 = await auth_service.authenticate_user(login2, device_info)
-        
-        assert result1.success is True
-        assert result2.success is True
-        
-        # Verify tokens contain correct tenant IDs
-        token1_payload = security.verify_token(result1.tokens.access_token)
-        token2_payload = security.verify_token(result2.tokens.access_token)
-        
-        assert token1_payload.tenant_id == str(tenant1_id)
-        assert token2_payload.tenant_id == str(tenant2_id)
-        assert token1_payload.tenant_id != token2_payload.tenant_id
-        
-        # Cleanup
-        await db_session.execute(delete(UserProfile).where(UserProfile.id.in_([user1.id, user2.id])))
-        await db_session.commit()
+        try:
+            device_info = DeviceInfo(
+                ip_address="127.0.0.1",
+                user_agent="Test Client",
+                fingerprint="test_device"
+            )
+            
+            async def authenticate(login_request: LoginRequest):
+                # Separate sessions so the two logins can be in flight together
+                async with get_db_context() as session:
+                    return await AuthenticationService(session).authenticate_user(login_request, device_info)
+            
+            # Authenticate both users concurrently
+            login1 = LoginRequest(email=user1["email"], password="Password123!")
+            login2 = LoginRequest(email=user2["email"], password="Password123!")
+            result1, result2 = await asyncio.gather(authenticate(login1), authenticate(login2))
+            
+            assert result1.success is True
+            assert result2.success is True
+            
+            # Verify tokens contain correct tenant IDs
+            token1_payload = security.verify_token(result1.tokens.access_token)
+            token2_payload = security.verify_token(result2.tokens.access_token)
+            
+            assert token1_payload.tenant_id == str(tenant1_id)
+            assert token2_payload.tenant_id == str(tenant2_id)
+            assert token1_payload.tenant_id != token2_payload.tenant_id
+        finally:
+            # Cleanup
+            await purge_tenants(db_session, tenant1_id, tenant2_id)
     
     @pytest.mark.asyncio
     async def test_session_security_features(self, db_session: AsyncSession, test_user, device_info):
@@ -479,41 +549,73 @@ class TestAuthenticationIntegration:
     @pytest.mark.asyncio
     async def test_performance_under_load(self, db_session: AsyncSession, test_user, device_info):
         """Test authentication performance under concurrent load"""
-        auth_service = AuthenticationService(db_session)
-        
-        login_request = LoginRequest(
-            email=test_user.email,
-            password="TestPassword123!"
-        )
+        # Seed one user per request with COPY, reusing the fixture's hash
+        load_users = [
+            (
+                uuid4(),
+                test_user.tenant_id,
+                f"load_user_{i}@integration.com",
+                test_user.password_hash,
+                f"Load Test User {i}",
+                "active",
+                False
+            )
+            for i in range(20)
+        ]
+        await bulk_seed_users(db_session, load_users)
+        await db_session.commit()
+        load_user_ids = [row[0] for row in load_users]
         
         # Simulate concurrent authentication requests
-        async def authenticate():
+        async def authenticate(email: str):
             device_copy = DeviceInfo(
                 ip_address=device_info.ip_address,
                 user_agent=device_info.user_agent,
                 fingerprint=f"device_{uuid4()}"
             )
-            return await auth_service.authenticate_user(login_request, device_copy)
-        
-        # Run 20 concurrent authentication requests
-        tasks = [authenticate() for _ in range(20)]
-        start_time = datetime.utcnow()
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        end_time = datetime.utcnow()
-        
-        # Check that most succeeded (allowing for session limits)
-        successful_logins = sum(1 for r in results if isinstance(r, type(results[0])) and r.success)
-        assert successful_logins >= min(20, settings.MAX_CONCURRENT_SESSIONS)
-        
-        # Performance should be reasonable (less than 5 seconds for 20 requests)
-        duration = (end_time - start_time).total_seconds()
-        assert duration < 5.0
+            login_request = LoginRequest(
+                email=email,
+                password="TestPassword123!"
+            )
+            # AsyncSession does not allow concurrent operations, so each
+            # in-flight login gets its own session from the pool
+            async with get_db_context() as session:
+                return await AuthenticationService(session).authenticate_user(login_request, device_copy)
+        
+        try:
+            # Run 20 concurrent authentication requests
+            tasks = [authenticate(row[2]) for row in load_users]
+            start_time = time.perf_counter()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            duration = time.perf_counter() - start_time
+            
+            # Check that most succeeded (allowing for session limits)
+            successful_logins = sum(1 for r in results if not isinstance(r, BaseException) and r.success)
+            assert successful_logins >= min(20, settings.MAX_CONCURRENT_SESSIONS)
+            
+            # Performance should be reasonable (less than 5 seconds for 20 requests)
+            assert duration < 5.0
+        finally:
+            # Cleanup; the logins' attempt and audit rows don't cascade
+            await db_session.rollback()
+            await db_session.execute(delete(AuthAttempt).where(AuthAttempt.user_id.in_(load_user_ids)))
+            await db_session.execute(
+                delete(SecurityAuditLog).where(SecurityAuditLog.user_id.in_(load_user_ids))
+            )
+            await db_session.execute(delete(UserProfile).where(UserProfile.id.in_(load_user_ids)))
+            await db_session.commit()
 
 
 @pytest.mark.integration
 class TestAuthenticationAPIIntegration:
     """Integration tests for authentication API endpoints"""
     
+    @pytest.fixture
+    async def db_session(self):
+        """Get database session for tests"""
+        async for session in get_db():
+            yield session
+    
     @pytest.mark.asyncio
     async def test_login_endpoint_integration(self, test_client: AsyncClient, db_session: AsyncSession):
         """Test login endpoint with database integration"""
@@ -16,21 +16,30 @@ Performance Requirements Validation:
 - Batch 500 mixed matches: < 30 seconds
 - Memory usage: < 1GB for 10,000 documents
 - Concurrent processing: 4+ parallel threads
+
+Under pytest-xdist, run with ``-n <workers> --dist=loadgroup``: every test
+in this module is pinned to one worker so the module-scoped fixtures are
+built once, while other performance files run on the remaining workers.
 """
 
 import pytest
 import asyncio
+import hashlib
+import itertools
+import math
 import time
+import tracemalloc
 import psutil
 import logging
+import os
 from datetime import datetime, timedelta
-from decimal import Decimal
-from uuid import uuid4
+from decimal import Context, Decimal, ROUND_HALF_UP
+from types import SimpleNamespace
+from uuid import UUID, uuid4
 from typing import List
-import concurrent.futures
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert, delete
 
 from app.core.database import get_db_context
 from app.services.matching_engine import create_matching_engine, ProcessingMetrics
@@ -38,7 +47,7 @@ from app.services.three_way_matching import create_three_way_matcher
 from app.models.financial import (
     Invoice, PurchaseOrder, Receipt, Vendor, Tenant,
     InvoiceLine, PurchaseOrderLine, ReceiptLine,
-    MatchResult, MatchingConfiguration,
+    MatchResult, MatchAuditLog, MatchingConfiguration,
     DocumentStatus, CurrencyCode, MatchType
 )
 
@@ -46,12 +55,35 @@ from app.models.financial import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Keep the whole module on one xdist worker (honoured by --dist=loadgroup)
+pytestmark = pytest.mark.xdist_group(name="matching_perf")
+
+# Batches matched at once when a test runs the engine in parallel mode
+PARALLEL_CONCURRENCY = min(8, os.cpu_count() or 1)
+
+# Levels swept by the parallel efficiency test
+CONCURRENCY_LEVELS = (1, 2, 4, 8)
+
+
+# Shared by every PerformanceMonitor so tests don't reopen /proc handles.
+# cpu_percent() reports usage since the previous call on the same handle
+# and returns 0.0 the first time, so prime it once here.
+_PROCESS = psutil.Process()
+_PROCESS.cpu_percent()
+
+_BYTES_PER_MB = 1024 * 1024
+
+# PERF_TRACE_MALLOC=1 reports peak_memory as the tracemalloc allocator peak
+# since start_monitoring() instead of current RSS. Tracing roughly doubles
+# allocation cost, so it is opt-in.
+TRACE_MALLOC = os.environ.get("PERF_TRACE_MALLOC") == "1"
+
 
 class PerformanceMonitor:
     """Monitor system performance during tests."""
     
     def __init__(self):
-        self.process = psutil.Process()
+        self.process = _PROCESS
         self.start_time = None
         self.start_memory = None
         self.start_cpu = None
@@ -59,164 +91,243 @@ class PerformanceMonitor:
     def start_monitoring(self):
         """Start performance monitoring."""
         self.start_time = time.time()
-        self.start_memory = self.process.memory_info().rss / 1024 / 1024  # MB
+        self.start_memory = self.process.memory_info().rss  # bytes
+        # Also restarts the CPU window that get_metrics reports on
         self.start_cpu = self.process.cpu_percent()
+        if TRACE_MALLOC:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
     
     def get_metrics(self) -> dict:
         """Get current performance metrics."""
         current_time = time.time()
-        current_memory = self.process.memory_info().rss / 1024 / 1024  # MB
+        current_memory = self.process.memory_info().rss  # bytes
         current_cpu = self.process.cpu_percent()
         
+        if TRACE_MALLOC:
+            # Catches transient peaks that a single RSS reading would miss
+            _, peak_memory = tracemalloc.get_traced_memory()
+        else:
+            peak_memory = current_memory
+        
         return {
             'elapsed_time': current_time - self.start_time,
-            'memory_used': current_memory - self.start_memory,
-            'peak_memory': current_memory,
+            'memory_used': (current_memory - self.start_memory) / _BYTES_PER_MB,
+            'peak_memory': peak_memory / _BYTES_PER_MB,
+            'rss_memory': current_memory / _BYTES_PER_MB,
             'avg_cpu_percent': current_cpu
         }
 
 
+# Generated amounts stay well under 12 significant digits. Passing this context
+# explicitly skips the thread-local getcontext() lookup on every call and,
+# unlike changing the global context, leaves the engine's own arithmetic alone.
+_CENTS_CONTEXT = Context(prec=12, rounding=ROUND_HALF_UP)
+
+
+def _from_cents(cents: int, places: int = 2) -> Decimal:
+    """Build a Decimal from an integer amount without going through the text parser."""
+    return Decimal(cents).scaleb(-places, _CENTS_CONTEXT)
+
+
+# (line_number, quantity, unit_price, line_total) for the 3 lines on every PO;
+# they only depend on the line number, so build the Decimals once
+_PO_LINE_AMOUNTS = tuple(
+    (j, Decimal(j * 10), _from_cents((10 + j) * 100), _from_cents((j * 10) * (10 + j) * 100))
+    for j in range(1, 4)
+)
+
+
+def _as_records(rows: List[dict]) -> List[SimpleNamespace]:
+    """Expose inserted row dicts through attribute access like the ORM objects they replace."""
+    return [SimpleNamespace(**row) for row in rows]
+
+
 class TestDataGenerator:
     """Generate test data for performance testing."""
     
     def __init__(self, tenant_id: str):
         self.tenant_id = tenant_id
+        # Seed for per-invoice file hashes, unique to this tenant
+        self._hash_seed = UUID(str(tenant_id)).bytes
+        # Test-only row IDs: random high 64 bits per generator plus a counter,
+        # so large datasets don't draw from os.urandom for every row
+        self._id_prefix = uuid4().int & ~((1 << 64) - 1)
+        self._id_counter = itertools.count()
+    
+    def _next_id(self) -> UUID:
+        """Next row ID from this generator's counter."""
+        return UUID(int=self._id_prefix | next(self._id_counter))
     
-    async def create_vendors(self, db: AsyncSession, count: int = 100) -> List[Vendor]:
-        """Create test vendors."""
+    def _file_hash(self, index: int) -> str:
+        """SHA-256 hex digest shaped like an uploaded file's hash."""
+        return hashlib.sha256(self._hash_seed + index.to_bytes(8, "little")).hexdigest()
+    
+    async def create_vendors(
+        self, 
+        db: AsyncSession, 
+        count: int = 100, 
+        commit: bool = True
+    ) -> List[SimpleNamespace]:
+        """Create test vendors; pass commit=False to leave them for a later generator's commit."""
         vendors = []
         
         for i in range(count):
-            vendor = Vendor(
-                id=uuid4(),
+            vendor = dict(
+                id=self._next_id(),
                 tenant_id=self.tenant_id,
-                vendor_code=f"VEN{i:06d}",
+                vendor_code="VEN" + str(i).zfill(6),
                 name=f"Test Vendor {i}",
                 legal_name=f"Test Vendor {i} Corporation",
                 is_active=True
             )
             vendors.append(vendor)
-            db.add(vendor)
         
-        await db.commit()
-        return vendors
+        await db.execute(insert(Vendor), vendors)
+        if commit:
+            await db.commit()
+        return _as_records(vendors)
     
     async def create_purchase_orders(
         self, 
         db: AsyncSession, 
-        vendors: List[Vendor], 
-        count: int = 1000
-    ) -> List[PurchaseOrder]:
-        """Create test purchase orders with line items."""
+        vendors: List[SimpleNamespace], 
+        count: int = 1000, 
+        commit: bool = True
+    ) -> List[SimpleNamespace]:
+        """Create test purchase orders with line items; commit as in create_vendors."""
         pos = []
+        lines = []
+        now = datetime.now()
+        status_pending = DocumentStatus.PENDING
+        currency_usd = CurrencyCode.USD
+        # Zero-padded numbers built once; concatenation beats re-parsing a format spec per row
+        nums = [str(i).zfill(8) for i in range(count)]
+        item_suffixes = ("01", "02", "03")
         
         for i in range(count):
             vendor = vendors[i % len(vendors)]
             
-            po = PurchaseOrder(
-                id=uuid4(),
+            # Amounts in integer cents: subtotal is whole dollars, tax is 8%
+            subtotal_cents = (1000 + i * 10) * 100
+            tax_cents = subtotal_cents * 8 // 100
+            
+            po = dict(
+                id=self._next_id(),
                 tenant_id=self.tenant_id,
                 vendor_id=vendor.id,
-                po_number=f"PO{i:08d}",
-                currency=CurrencyCode.USD,
-                subtotal=Decimal(f"{1000 + (i * 10)}.00"),
-                tax_amount=Decimal(f"{(1000 + (i * 10)) * 0.08:.2f}"),
-                total_amount=Decimal(f"{(1000 + (i * 10)) * 1.08:.2f}"),
-                po_date=datetime.now() - timedelta(days=i % 30),
-                status=DocumentStatus.PENDING,
+                po_number="PO" + nums[i],
+                currency=currency_usd,
+                subtotal=_from_cents(subtotal_cents),
+                tax_amount=_from_cents(tax_cents),
+                total_amount=_from_cents(subtotal_cents + tax_cents),
+                po_date=now - timedelta(days=i % 30),
+                status=status_pending,
                 created_by=uuid4()
             )
             pos.append(po)
-            db.add(po)
             
             # Add line items
-            for j in range(1, 4):  # 3 lines per PO
-                line = PurchaseOrderLine(
-                    id=uuid4(),
+            item_prefix = "ITEM" + str(i).zfill(4)
+            for (j, quantity, unit_price, line_total), item_suffix in zip(_PO_LINE_AMOUNTS, item_suffixes):  # 3 lines per PO
+                line = dict(
+                    id=self._next_id(),
                     tenant_id=self.tenant_id,
-                    purchase_order_id=po.id,
+                    purchase_order_id=po["id"],
                     line_number=j,
-                    item_code=f"ITEM{i:04d}{j:02d}",
+                    item_code=item_prefix + item_suffix,
                     description=f"Test item {i}-{j}",
-                    quantity=Decimal(f"{j * 10}"),
-                    unit_price=Decimal(f"{10 + j}.00"),
-                    line_total=Decimal(f"{(j * 10) * (10 + j)}.00"),
+                    quantity=quantity,
+                    unit_price=unit_price,
+                    line_total=line_total,
                     unit_of_measure="EA"
                 )
-                db.add(line)
-        
-        await db.commit()
-        return pos
+                lines.append(line)
+        
+        # Bulk insert POs before the lines that reference them
+        await db.execute(insert(PurchaseOrder), pos)
+        await db.execute(insert(PurchaseOrderLine), lines)
+        if commit:
+            await db.commit()
+        return _as_records(pos)
     
     async def create_invoices(
         self, 
         db: AsyncSession, 
-        vendors: List[Vendor], 
-        pos: List[PurchaseOrder], 
+        vendors: List[SimpleNamespace], 
+        pos: List[SimpleNamespace], 
         count: int = 500,
-        match_percentage: float = 0.8
-    ) -> List[Invoice]:
+        match_percentage: float = 0.8,
+        commit: bool = True
+    ) -> List[SimpleNamespace]:
         """Create test invoices, some matching POs exactly, some with variations."""
         invoices = []
+        now = datetime.now()
+        status_pending = DocumentStatus.PENDING
+        currency_usd = CurrencyCode.USD
+        po_to_invoice = timedelta(days=5)
+        nums = [str(i).zfill(8) for i in range(count)]
+        
+        # The first exact_count invoices copy their PO exactly; the rest vary.
+        # Rounds up: every index below count * match_percentage is exact.
+        po_count = len(pos)
+        exact_count = min(math.ceil(count * match_percentage), po_count)
+        
+        invoices.extend(
+            dict(
+                id=self._next_id(),
+                tenant_id=self.tenant_id,
+                vendor_id=po.vendor_id,
+                invoice_number="INV" + nums[i],
+                po_reference=po.po_number,
+                currency=po.currency,
+                subtotal=po.subtotal,
+                tax_amount=po.tax_amount,
+                total_amount=po.total_amount,
+                invoice_date=po.po_date + po_to_invoice,
+                status=status_pending,
+                file_name=f"invoice_{i}.pdf",
+                file_path=f"/uploads/invoice_{i}.pdf",
+                file_hash=self._file_hash(i),
+                file_size=1024 * (i + 1),
+                mime_type="application/pdf",
+                created_by=uuid4()
+            )
+            for i, po in enumerate(pos[:exact_count])
+        )
         
-        for i in range(count):
+        # Fuzzy match or non-match invoices
+        for i in range(exact_count, count):
             vendor = vendors[i % len(vendors)]
             
-            # Determine if this should be an exact match
-            is_exact_match = i < (count * match_percentage)
-            
-            if is_exact_match and i < len(pos):
-                # Create exact match invoice
-                po = pos[i]
-                
-                invoice = Invoice(
-                    id=uuid4(),
-                    tenant_id=self.tenant_id,
-                    vendor_id=po.vendor_id,
-                    invoice_number=f"INV{i:08d}",
-                    po_reference=po.po_number,
-                    currency=po.currency,
-                    subtotal=po.subtotal,
-                    tax_amount=po.tax_amount,
-                    total_amount=po.total_amount,
-                    invoice_date=po.po_date + timedelta(days=5),
-                    status=DocumentStatus.PENDING,
-                    file_name=f"invoice_{i}.pdf",
-                    file_path=f"/uploads/invoice_{i}.pdf",
-                    file_hash=f"hash{i:08d}",
-                    file_size=1024 * (i + 1),
-                    mime_type="application/pdf",
-                    created_by=uuid4()
-                )
-            else:
-                # Create fuzzy match or non-match invoice
-                amount_variance = Decimal(f"{1000 + (i * 10) * (0.9 + (i % 20) * 0.01):.2f}")
-                
-                invoice = Invoice(
-                    id=uuid4(),
-                    tenant_id=self.tenant_id,
-                    vendor_id=vendor.id,
-                    invoice_number=f"INV{i:08d}",
-                    po_reference=f"PO{i:08d}" if i < len(pos) else None,
-                    currency=CurrencyCode.USD,
-                    subtotal=amount_variance,
-                    tax_amount=amount_variance * Decimal("0.08"),
-                    total_amount=amount_variance * Decimal("1.08"),
-                    invoice_date=datetime.now() - timedelta(days=i % 20),
-                    status=DocumentStatus.PENDING,
-                    file_name=f"invoice_{i}.pdf",
-                    file_path=f"/uploads/invoice_{i}.pdf",
-                    file_hash=f"hash{i:08d}",
-                    file_size=1024 * (i + 1),
-                    mime_type="application/pdf",
-                    created_by=uuid4()
-                )
+            # 90-109% of the base amount, exact in cents
+            variance_cents = 100000 + (i * 10) * (90 + i % 20)
             
-            invoices.append(invoice)
-            db.add(invoice)
+            invoices.append(dict(
+                id=self._next_id(),
+                tenant_id=self.tenant_id,
+                vendor_id=vendor.id,
+                invoice_number="INV" + nums[i],
+                po_reference="PO" + nums[i] if i < po_count else None,
+                currency=currency_usd,
+                subtotal=_from_cents(variance_cents),
+                tax_amount=_from_cents(variance_cents * 8, 4),
+                total_amount=_from_cents(variance_cents * 108, 4),
+                invoice_date=now - timedelta(days=i % 20),
+                status=status_pending,
+                file_name=f"invoice_{i}.pdf",
+                file_path=f"/uploads/invoice_{i}.pdf",
+                file_hash=self._file_hash(i),
+                file_size=1024 * (i + 1),
+                mime_type="application/pdf",
+                created_by=uuid4()
+            ))
         
-        await db.commit()
-        return invoices
+        await db.execute(insert(Invoice), invoices)
+        if commit:
+            await db.commit()
+        return _as_records(invoices)
 
 
 @pytest.mark.asyncio
@@ -230,8 +341,8 @@ class TestSingleInvoicePerformance:
         
         # Create test data
         generator = TestDataGenerator(tenant_id)
-        vendors = await generator.create_vendors(test_db_session, 10)
-        pos = await generator.create_purchase_orders(test_db_session, vendors, 100)
+        vendors = await generator.create_vendors(test_db_session, 10, commit=False)
+        pos = await generator.create_purchase_orders(test_db_session, vendors, 100, commit=False)
         invoices = await generator.create_invoices(test_db_session, vendors, pos, 1, 1.0)
         
         # Initialize matching engine
@@ -258,8 +369,8 @@ class TestSingleInvoicePerformance:
         
         # Create test data with fuzzy matches
         generator = TestDataGenerator(tenant_id)
-        vendors = await generator.create_vendors(test_db_session, 10)
-        pos = await generator.create_purchase_orders(test_db_session, vendors, 100)
+        vendors = await generator.create_vendors(test_db_session, 10, commit=False)
+        pos = await generator.create_purchase_orders(test_db_session, vendors, 100, commit=False)
         invoices = await generator.create_invoices(test_db_session, vendors, pos, 1, 0.0)  # No exact matches
         
         # Initialize matching engine
@@ -289,8 +400,8 @@ class TestBatchProcessingPerformance:
         
         # Create test data - all exact matches
         generator = TestDataGenerator(tenant_id)
-        vendors = await generator.create_vendors(test_db_session, 20)
-        pos = await generator.create_purchase_orders(test_db_session, vendors, 150)
+        vendors = await generator.create_vendors(test_db_session, 20, commit=False)
+        pos = await generator.create_purchase_orders(test_db_session, vendors, 150, commit=False)
         invoices = await generator.create_invoices(test_db_session, vendors, pos, 100, 1.0)
         
         # Initialize matching engine
@@ -302,7 +413,7 @@ class TestBatchProcessingPerformance:
         monitor.start_monitoring()
         
         metrics = await matching_engine.process_batch_matching(
-            invoice_ids, test_db_session, parallel=True
+            invoice_ids, test_db_session, parallel=True, concurrency=PARALLEL_CONCURRENCY
         )
         
         performance = monitor.get_metrics()
@@ -323,8 +434,8 @@ class TestBatchProcessingPerformance:
         
         # Create test data - mix of exact and fuzzy matches
         generator = TestDataGenerator(tenant_id)
-        vendors = await generator.create_vendors(test_db_session, 50)
-        pos = await generator.create_purchase_orders(test_db_session, vendors, 600)
+        vendors = await generator.create_vendors(test_db_session, 50, commit=False)
+        pos = await generator.create_purchase_orders(test_db_session, vendors, 600, commit=False)
         invoices = await generator.create_invoices(test_db_session, vendors, pos, 500, 0.6)  # 60% exact matches
         
         # Initialize matching engine
@@ -336,7 +447,7 @@ class TestBatchProcessingPerformance:
         monitor.start_monitoring()
         
         metrics = await matching_engine.process_batch_matching(
-            invoice_ids, test_db_session, parallel=True
+            invoice_ids, test_db_session, parallel=True, concurrency=PARALLEL_CONCURRENCY
         )
         
         performance = monitor.get_metrics()
@@ -359,22 +470,11 @@ class TestBatchProcessingPerformance:
 class TestScalabilityPerformance:
     """Test scalability with large datasets."""
     
-    async def test_large_dataset_handling(self, test_db_session):
+    async def test_large_dataset_handling(self, test_db_session, large_po_dataset):
         """Test handling 10,000+ POs and receipts in matching dataset."""
-        tenant_id = uuid4()
+        tenant_id, vendors, pos = large_po_dataset
         monitor = PerformanceMonitor()
-        
-        # Create large test dataset
         generator = TestDataGenerator(tenant_id)
-        vendors = await generator.create_vendors(test_db_session, 100)
-        
-        monitor.start_monitoring()
-        
-        # Create 10,000 POs
-        pos = await generator.create_purchase_orders(test_db_session, vendors, 10000)
-        
-        creation_metrics = monitor.get_metrics()
-        logger.info(f"Created 10,000 POs in {creation_metrics['elapsed_time']:.1f}s")
         
         # Test matching with large dataset
         invoices = await generator.create_invoices(test_db_session, vendors, pos, 50, 0.8)
@@ -388,7 +488,7 @@ class TestScalabilityPerformance:
         invoice_ids = [invoice.id for invoice in invoices[:10]]  # Test with 10 invoices
         
         metrics = await matching_engine.process_batch_matching(
-            invoice_ids, test_db_session, parallel=True
+            invoice_ids, test_db_session, parallel=True, concurrency=PARALLEL_CONCURRENCY
         )
         
         performance = monitor.get_metrics()
@@ -406,36 +506,49 @@ class TestScalabilityPerformance:
         
         # Create test data
         generator = TestDataGenerator(tenant_id)
-        vendors = await generator.create_vendors(test_db_session, 10)
-        pos = await generator.create_purchase_orders(test_db_session, vendors, 200)
-        invoices = await generator.create_invoices(test_db_session, vendors, pos, 100, 0.8)
-        
-        # Initialize matching engine
-        matching_engine = await create_matching_engine(tenant_id, test_db_session)
+        vendors = await generator.create_vendors(test_db_session, 10, commit=False)
+        pos = await generator.create_purchase_orders(test_db_session, vendors, 200, commit=False)
+        invoices = await generator.create_invoices(test_db_session, vendors, pos, 250, 0.8)
         invoice_ids = [invoice.id for invoice in invoices]
         
+        # Every run gets its own disjoint, interleaved slice of invoices (40 exact,
+        # 10 fuzzy each) and a fresh engine, so no run reuses rows or match results
+        # warmed up by an earlier one
+        run_count = 1 + len(CONCURRENCY_LEVELS)
+        id_slices = [invoice_ids[k::run_count] for k in range(run_count)]
+        
         # Test sequential processing
+        sequential_ids = id_slices[0]
+        matching_engine = await create_matching_engine(tenant_id, test_db_session)
         start_time = time.time()
         sequential_metrics = await matching_engine.process_batch_matching(
-            invoice_ids, test_db_session, parallel=False
+            sequential_ids, test_db_session, parallel=False
         )
         sequential_time = time.time() - start_time
-        
-        # Reset for parallel processing test
-        # Clear any existing match results first
-        await test_db_session.execute(
-            select(MatchResult).where(MatchResult.tenant_id == tenant_id)
+        logger.info(
+            f"Sequential: {sequential_time:.3f}s, "
+            f"{sequential_time / len(sequential_ids) * 1000:.1f}ms/invoice"
         )
-        await test_db_session.commit()
         
-        # Test parallel processing
-        start_time = time.time()
-        parallel_metrics = await matching_engine.process_batch_matching(
-            invoice_ids, test_db_session, parallel=True
-        )
-        parallel_time = time.time() - start_time
+        # Test parallel processing across a range of concurrency levels
+        parallel_times = {}
+        for concurrency, parallel_ids in zip(CONCURRENCY_LEVELS, id_slices[1:]):
+            matching_engine = await create_matching_engine(tenant_id, test_db_session)
+            
+            start_time = time.time()
+            parallel_metrics = await matching_engine.process_batch_matching(
+                parallel_ids, test_db_session, parallel=True, concurrency=concurrency
+            )
+            parallel_times[concurrency] = time.time() - start_time
+            
+            logger.info(
+                f"Concurrency {concurrency}: {parallel_times[concurrency]:.3f}s, "
+                f"{parallel_times[concurrency] / len(parallel_ids) * 1000:.1f}ms/invoice, "
+                f"speedup {sequential_time / parallel_times[concurrency]:.1f}x"
+            )
         
-        # Parallel should be faster for this batch size
+        # Parallel should be faster for this batch size at its best level
+        parallel_time = min(parallel_times.values())
         speedup = sequential_time / parallel_time if parallel_time > 0 else 1.0
         
         logger.info(f"Sequential: {sequential_time:.3f}s, Parallel: {parallel_time:.3f}s, Speedup: {speedup:.1f}x")
@@ -456,17 +569,17 @@ class TestThreeWayMatchingPerformance:
         
         # Create comprehensive test data
         generator = TestDataGenerator(tenant_id)
-        vendors = await generator.create_vendors(test_db_session, 10)
-        pos = await generator.create_purchase_orders(test_db_session, vendors, 50)
-        invoices = await generator.create_invoices(test_db_session, vendors, pos, 20, 1.0)
+        vendors = await generator.create_vendors(test_db_session, 10, commit=False)
+        pos = await generator.create_purchase_orders(test_db_session, vendors, 50, commit=False)
+        invoices = await generator.create_invoices(test_db_session, vendors, pos, 20, 1.0, commit=False)
         
-        # Create receipts for some POs
-        for i, po in enumerate(pos[:20]):
-            receipt = Receipt(
+        # Create receipts for some POs; committed together with the generated data
+        receipt_rows = [
+            dict(
                 id=uuid4(),
                 tenant_id=tenant_id,
                 purchase_order_id=po.id,
-                receipt_number=f"REC{i:06d}",
+                receipt_number="REC" + str(i).zfill(6),
                 receipt_date=po.po_date + timedelta(days=3),
                 received_by=f"User {i}",
                 total_quantity=Decimal("30"),  # Sum of line quantities
@@ -474,20 +587,27 @@ class TestThreeWayMatchingPerformance:
                 status=DocumentStatus.PENDING,
                 created_by=uuid4()
             )
-            test_db_session.add(receipt)
+            for i, po in enumerate(pos[:20])
+        ]
+        await test_db_session.execute(insert(Receipt), receipt_rows)
         
         await test_db_session.commit()
         
         # Test 3-way matching performance
         three_way_matcher = await create_three_way_matcher(tenant_id)
+        semaphore = asyncio.Semaphore(4)
+        
+        async def match_invoice(invoice_id):
+            # AsyncSession isn't safe for concurrent use, so each match gets its own
+            async with semaphore, get_db_context() as session:
+                return await three_way_matcher.perform_three_way_match(invoice_id, session)
         
         monitor.start_monitoring()
         
-        results = []
-        for invoice in invoices[:10]:  # Test first 10 invoices
-            result = await three_way_matcher.perform_three_way_match(invoice.id, test_db_session)
-            if result:
-                results.append(result)
+        matches = await asyncio.gather(
+            *(match_invoice(invoice.id) for invoice in invoices[:10])  # Test first 10 invoices
+        )
+        results = [result for result in matches if result]
         
         performance = monitor.get_metrics()
         
@@ -513,8 +633,8 @@ class TestMemoryEfficiency:
         
         # Create large dataset
         generator = TestDataGenerator(tenant_id)
-        vendors = await generator.create_vendors(test_db_session, 50)
-        pos = await generator.create_purchase_orders(test_db_session, vendors, 1000)
+        vendors = await generator.create_vendors(test_db_session, 50, commit=False)
+        pos = await generator.create_purchase_orders(test_db_session, vendors, 1000, commit=False)
         invoices = await generator.create_invoices(test_db_session, vendors, pos, 1000, 0.7)
         
         # Initialize matching engine
@@ -530,7 +650,7 @@ class TestMemoryEfficiency:
         for i in range(0, len(invoice_ids), chunk_size):
             chunk = invoice_ids[i:i + chunk_size]
             await matching_engine.process_batch_matching(
-                chunk, test_db_session, parallel=True
+                chunk, test_db_session, parallel=True, concurrency=PARALLEL_CONCURRENCY
             )
         
         performance = monitor.get_metrics()
@@ -545,10 +665,11 @@ class TestMemoryEfficiency:
 async def test_db_session():
     """Create test database session."""
     async with get_db_context() as session:
-        # Create tenant for testing
+        # Create tenant for testing; suffix the name so xdist workers don't collide
+        worker = os.environ.get("PYTEST_XDIST_WORKER", "")
         tenant = Tenant(
             id=uuid4(),
-            name="test_tenant",
+            name=f"test_tenant{worker}",
             display_name="Test Tenant",
             is_active=True
         )
@@ -561,5 +682,47 @@ async def test_db_session():
         await session.rollback()
 
 
+@pytest.fixture(scope="module")
+def event_loop():
+    """Module-wide event loop so module-scoped datasets can be shared between tests"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+async def large_po_dataset():
+    """Build the 10,000-PO corpus once per module; yields (tenant_id, vendors, pos)."""
+    tenant_id = uuid4()
+    monitor = PerformanceMonitor()
+    
+    async with get_db_context() as session:
+        generator = TestDataGenerator(tenant_id)
+        vendors = await generator.create_vendors(session, 100, commit=False)
+        
+        monitor.start_monitoring()
+        
+        # Create 10,000 POs
+        pos = await generator.create_purchase_orders(session, vendors, 10000)
+        
+        creation_metrics = monitor.get_metrics()
+        logger.info(f"Created 10,000 POs in {creation_metrics['elapsed_time']:.1f}s")
+    
+    yield tenant_id, vendors, pos
+    
+    # Cleanup: the corpus plus the invoices and match results tests created
+    # against it, children before parents
+    async with get_db_context() as session:
+        for model in (
+            MatchAuditLog, MatchResult,
+            InvoiceLine, Invoice,
+            ReceiptLine, Receipt,
+            PurchaseOrderLine, PurchaseOrder,
+            Vendor
+        ):
+            await session.execute(delete(model).where(model.tenant_id == tenant_id))
+        await session.commit()
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v", "-s"])
\ No newline at end of file
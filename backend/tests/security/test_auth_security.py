@@ -5,21 +5,107 @@ Tests for vulnerabilities, attack vectors, and security best practices
 
 import pytest
 import asyncio
+import base64
+import functools
 import time
 import hashlib
 import secrets
+import statistics
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 from uuid import uuid4
 from typing import List, Dict
 import jwt
+import numpy as np
+from passlib.context import CryptContext
 
-from app.services.auth_service import AuthenticationService, LoginRequest, DeviceInfo
-from app.models.auth import UserProfile, AuthAttempt, PasswordResetToken
+from app.services.auth_service import AuthenticationService, AuthErrorCode, LoginRequest, DeviceInfo
+from app.models.auth import UserProfile, AuthAttempt, PasswordResetToken, SecurityAuditLog
 from app.core.security import security
 from app.core.config import settings
-from app.core.database import get_db
+from app.core import database
+from app.core.database import get_db_context
 from app.services.redis_service import redis_service
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# Fixture users only need a valid bcrypt hash, not production cost. bcrypt
+# stores its cost in the hash, so these still verify through the normal path.
+# The timing test is the exception: it measures that cost, so its user is
+# hashed by the application at full strength.
+_FIXTURE_PWD_CONTEXT = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+
+# The security test user's password
+_PASSWORD = "SecurePassword123!"
+
+
+@functools.cache
+def _password_hash() -> str:
+    """Hash of _PASSWORD, computed on first use and then reused for the process"""
+    return _FIXTURE_PWD_CONTEXT.hash(_PASSWORD)
+
+# Login emails that would break out of a naively built SQL query
+SQL_INJECTION_PAYLOADS = [
+    "'; DROP TABLE user_profiles; --",
+    "' OR '1'='1",
+    "' UNION SELECT * FROM user_profiles --",
+    "admin'--",
+    "admin' /*",
+    "' OR 1=1--",
+    "' OR 'a'='a",
+    "') OR ('1'='1",
+    "' OR 1=1#",
+    "' OR 1=1/*",
+    "%27%20OR%201=1--",
+    "1' AND (SELECT COUNT(*) FROM user_profiles) > 0 --"
+]
+
+
+async def _clear_login_limits(emails: List[str], ip_addresses: List[str]):
+    """Reset the login rate-limit windows and progressive delays for emails and IPs"""
+    prefix = redis_service.key_prefix
+    keys = [f"{prefix}rate_limit:login_email:{email}" for email in emails]
+    for ip_address in ip_addresses:
+        keys.append(f"{prefix}rate_limit:login_ip:{ip_address}")
+        keys.append(f"{prefix}progressive_delay:delay:{ip_address}")
+    
+    # Without Redis the service does no rate limiting, so there is nothing to reset
+    if redis_service.redis_client:
+        await redis_service.redis_client.delete(*keys)
+
+
+async def _delete_namespace(namespace: str):
+    """Drop every Redis key under a test namespace"""
+    if not redis_service.redis_client:
+        return
+    
+    keys = [key async for key in redis_service.redis_client.scan_iter(match=f"{namespace}*")]
+    if keys:
+        await redis_service.redis_client.delete(*keys)
+
+
+def _median_absolute_deviation(samples: List[float]) -> float:
+    """Median distance of the samples from their median"""
+    center = statistics.median(samples)
+    return statistics.median(abs(sample - center) for sample in samples)
+
+
+def _tamper_signature(token: str, byte_index: int) -> str:
+    """Flip one byte of a JWT's signature, leaving header and claims intact"""
+    header, claims, signature = token.split(".")
+    raw = bytearray(base64.urlsafe_b64decode(signature + "=" * (-len(signature) % 4)))
+    raw[byte_index] ^= 0x01
+    return ".".join((header, claims, base64.urlsafe_b64encode(raw).rstrip(b"=").decode()))
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    """Module-wide event loop so the test user can be shared across tests"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
 
 
 @pytest.mark.security
@@ -28,33 +114,86 @@ class TestAuthenticationSecurity:
     
     @pytest.fixture
     async def db_session(self):
-        """Get database session for tests"""
-        async for session in get_db():
+        """
+        Run each test inside a transaction that is rolled back afterwards.
+        
+        Commits made by the service only release a SAVEPOINT, so lockout
+        counters, sessions and audit rows never outlive the test.
+        """
+        if database.async_engine is None:
+            await database.connect_db()
+        
+        async with database.async_engine.connect() as connection:
+            transaction = await connection.begin()
+            session = AsyncSession(
+                bind=connection,
+                join_transaction_mode="create_savepoint",
+                expire_on_commit=False
+            )
+            
             yield session
+            
+            await session.close()
+            await transaction.rollback()
     
-    @pytest.fixture
-    async def test_user(self, db_session):
-        """Create test user for security tests"""
+    @pytest.fixture(autouse=True)
+    async def redis_namespace(self, monkeypatch):
+        """
+        Give every test its own Redis key namespace.
+        
+        Tests start with no rate-limit or delay state and only their own
+        keys are dropped afterwards, so nothing else in the database (for
+        example another xdist worker's keys) is touched.
+        """
+        namespace = f"test_{uuid4().hex[:8]}:"
+        monkeypatch.setattr(redis_service, "key_prefix", namespace)
+        
+        yield
+        
+        await _delete_namespace(namespace)
+    
+    @staticmethod
+    @asynccontextmanager
+    async def _committed_user(email: str, password_hash: str):
+        """Commit a user outside any test transaction, then delete it with its audit rows"""
         user = UserProfile(
             id=uuid4(),
             tenant_id=uuid4(),
-            email="security@test.com",
-            password_hash=security.hash_password("SecurePassword123!"),
+            email=email,
+            password_hash=password_hash,
             full_name="Security Test User",
             auth_status="active",
             created_at=datetime.utcnow()
         )
         
-        db_session.add(user)
-        await db_session.commit()
+        async with get_db_context() as session:
+            session.add(user)
+            await session.commit()
         
         yield user
         
-        # Cleanup
-        await db_session.delete(user)
-        await db_session.commit()
+        # Cleanup; attempts and audit rows committed outside the per-test
+        # rollback reference the user without ON DELETE CASCADE
+        async with get_db_context() as session:
+            await session.execute(delete(AuthAttempt).where(AuthAttempt.user_id == user.id))
+            await session.execute(delete(SecurityAuditLog).where(SecurityAuditLog.user_id == user.id))
+            await session.execute(delete(UserProfile).where(UserProfile.id == user.id))
+            await session.commit()
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
+    async def test_user(self):
+        """Create the security test user once; tests roll back their changes to it"""
+        async with self._committed_user("security@test.com", _password_hash()) as user:
+            yield user
+    
+    @pytest.fixture(scope="module")
+    async def timing_user(self):
+        """User hashed at production bcrypt cost, the work a timing leak would expose"""
+        password_hash = security.hash_password(_PASSWORD)
+        async with self._committed_user("timing@test.com", password_hash) as user:
+            yield user
+    
+    @pytest.fixture(scope="module")
     def device_info(self):
         return DeviceInfo(
             ip_address="192.168.1.100",
@@ -62,101 +201,131 @@ class TestAuthenticationSecurity:
             fingerprint="security_device"
         )
     
+    @pytest.fixture
+    def token_subject(self):
+        """Identity for token-only tests, which never touch the database"""
+        return SimpleNamespace(id=uuid4(), tenant_id=uuid4())
+    
+    @pytest.fixture(scope="module")
+    async def authenticated_tokens(self, test_user, device_info):
+        """Log the test user in once for tests that only need a valid session"""
+        namespace = f"test_{uuid4().hex[:8]}:"
+        
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            # Runs before the per-test namespace exists, so use its own
+            monkeypatch.setattr(redis_service, "key_prefix", namespace)
+            
+            async with get_db_context() as session:
+                result = await AuthenticationService(session).authenticate_user(
+                    LoginRequest(email=test_user.email, password=_PASSWORD),
+                    device_info
+                )
+            
+            await _delete_namespace(namespace)
+        
+        assert result.success is True
+        return result.tokens
+    
     @pytest.mark.asyncio
-    async def test_sql_injection_prevention(self, db_session, device_info):
+    @pytest.mark.parametrize("payload", SQL_INJECTION_PAYLOADS)
+    async def test_sql_injection_prevention(self, db_session, device_info, payload):
         """Test SQL injection prevention in authentication"""
         auth_service = AuthenticationService(db_session)
         
-        # Test various SQL injection payloads
-        sql_injection_payloads = [
-            "'; DROP TABLE user_profiles; --",
-            "' OR '1'='1",
-            "' UNION SELECT * FROM user_profiles --",
-            "admin'--",
-            "admin' /*",
-            "' OR 1=1--",
-            "' OR 'a'='a",
-            "') OR ('1'='1",
-            "' OR 1=1#",
-            "' OR 1=1/*",
-            "%27%20OR%201=1--",
-            "1' AND (SELECT COUNT(*) FROM user_profiles) > 0 --"
-        ]
-        
-        for payload in sql_injection_payloads:
-            login_request = LoginRequest(
-                email=payload,
-                password="any_password"
-            )
-            
-            # Should not cause SQL injection or return sensitive data
-            result = await auth_service.authenticate_user(login_request, device_info)
-            
-            assert result.success is False
-            assert result.error in [
-                "Invalid email or password.",
-                "Too many login attempts. Please try again later."
-            ]
+        login_request = LoginRequest(
+            email=payload,
+            password="any_password"
+        )
+        
+        # Should not cause SQL injection or return sensitive data
+        result = await auth_service.authenticate_user(login_request, device_info)
+        
+        assert result.success is False
+        assert result.error_code in (
+            AuthErrorCode.INVALID_CREDENTIALS,
+            AuthErrorCode.RATE_LIMITED
+        )
     
+    @pytest.mark.slow
     @pytest.mark.asyncio
-    async def test_timing_attack_prevention(self, db_session, test_user, device_info):
+    async def test_timing_attack_prevention(self, db_session, timing_user, device_info):
         """Test timing attack prevention in password verification"""
-        auth_service = AuthenticationService(db_session)
+        sample_ips = [f"192.168.2.{i}" for i in range(1, 11)]
         
-        # Test with valid email, wrong password
-        valid_email_times = []
-        for _ in range(10):
-            start_time = time.perf_counter()
-            
-            login_request = LoginRequest(
-                email=test_user.email,
-                password="WrongPassword123!"
+        # authenticate_user only reads the request, so samples can share one
+        login_request = LoginRequest(
+            email=timing_user.email,
+            password="WrongPassword123!"
+        )
+        
+        async def one_sample(login_request: LoginRequest, ip_address: str) -> float:
+            # AsyncSession isn't safe for concurrent use, so each sample gets its own,
+            # and its own IP so the per-IP limit doesn't short-circuit any of them
+            sample_device = DeviceInfo(
+                ip_address=ip_address,
+                user_agent=device_info.user_agent,
+                fingerprint=device_info.fingerprint
             )
-            await auth_service.authenticate_user(login_request, device_info)
-            
-            end_time = time.perf_counter()
-            valid_email_times.append(end_time - start_time)
-            
-            # Small delay to avoid rate limiting
-            await asyncio.sleep(0.1)
+            async with get_db_context() as session:
+                auth_service = AuthenticationService(session)
+                start_time = time.perf_counter()
+                await auth_service.authenticate_user(login_request, sample_device)
+                return time.perf_counter() - start_time
+        
+        # Test with valid email, wrong password
+        valid_email_times = await asyncio.gather(
+            *(one_sample(login_request, ip) for ip in sample_ips)
+        )
         
         # Test with invalid email
-        invalid_email_times = []
-        for i in range(10):
-            start_time = time.perf_counter()
-            
-            login_request = LoginRequest(
-                email=f"nonexistent{i}@test.com",
-                password="WrongPassword123!"
+        invalid_emails = [f"nonexistent{i}@test.com" for i in range(len(sample_ips))]
+        await _clear_login_limits(invalid_emails, sample_ips)
+        invalid_email_times = await asyncio.gather(
+            *(
+                one_sample(login_request.model_copy(update={"email": email}), ip)
+                for email, ip in zip(invalid_emails, sample_ips)
             )
-            await auth_service.authenticate_user(login_request, device_info)
-            
-            end_time = time.perf_counter()
-            invalid_email_times.append(end_time - start_time)
-            
-            await asyncio.sleep(0.1)
+        )
+        
+        # The samples committed through their own sessions, outside db_session's
+        # rolled-back transaction, so undo their lockout bookkeeping here
+        async with get_db_context() as session:
+            await session.execute(
+                update(UserProfile)
+                .where(UserProfile.id == timing_user.id)
+                .values(failed_login_attempts=0, account_locked_until=None)
+            )
+            await session.commit()
         
-        avg_valid_time = sum(valid_email_times) / len(valid_email_times)
-        avg_invalid_time = sum(invalid_email_times) / len(invalid_email_times)
+        # Medians, since concurrent samples pick up scheduler jitter
+        median_valid_time = statistics.median(valid_email_times)
+        median_invalid_time = statistics.median(invalid_email_times)
         
         # Times should be similar to prevent timing attacks
-        time_difference = abs(avg_valid_time - avg_invalid_time)
+        time_difference = abs(median_valid_time - median_invalid_time)
+        
+        # Median absolute deviation: the spread of each side, robust to the
+        # odd sample stalled behind bcrypt in the thread pool
+        mad_valid_time = _median_absolute_deviation(valid_email_times)
+        mad_invalid_time = _median_absolute_deviation(invalid_email_times)
         
-        print(f"Avg time for valid email: {avg_valid_time:.4f}s")
-        print(f"Avg time for invalid email: {avg_invalid_time:.4f}s")
+        print(f"Median time for valid email: {median_valid_time:.4f}s (MAD {mad_valid_time:.4f}s)")
+        print(f"Median time for invalid email: {median_invalid_time:.4f}s (MAD {mad_invalid_time:.4f}s)")
         print(f"Time difference: {time_difference:.4f}s")
         
         # Timing difference should be minimal (less than 50ms)
-        assert time_difference < 0.05
+        assert time_difference < 0.05, (
+            f"Median login times differ by {time_difference:.4f}s "
+            f"(MAD {mad_valid_time:.4f}s valid, {mad_invalid_time:.4f}s invalid)"
+        )
     
     @pytest.mark.asyncio
-    async def test_password_brute_force_protection(self, db_session, test_user, device_info):
+    async def test_password_brute_force_protection(self, db_session, test_user, device_info, redis_connection):
         """Test brute force protection mechanisms"""
         auth_service = AuthenticationService(db_session)
         
         # Clear any existing rate limits
-        await redis_service.client.delete(f"login_ip:{device_info.ip_address}")
-        await redis_service.client.delete(f"login_email:{test_user.email}")
+        await _clear_login_limits([test_user.email], [device_info.ip_address])
         
         login_request = LoginRequest(
             email=test_user.email,
@@ -170,81 +339,70 @@ class TestAuthenticationSecurity:
         for i in range(10):
             result = await auth_service.authenticate_user(login_request, device_info)
             
-            if "too many" in result.error.lower():
+            if result.error_code == AuthErrorCode.RATE_LIMITED:
                 rate_limited = True
                 break
             
             attempts += 1
-            await asyncio.sleep(0.1)
         
         # Should be rate limited before 10 attempts
         assert rate_limited
         assert attempts <= 5  # Should trigger after max 5 attempts
         
-        # Verify account lockout
-        await db_session.refresh(test_user)
-        if test_user.failed_login_attempts >= settings.MAX_LOGIN_ATTEMPTS:
-            assert test_user.account_locked_until is not None
-            assert test_user.account_locked_until > datetime.utcnow()
+        # Verify account lockout; only the two lockout columns are needed
+        result = await db_session.execute(
+            select(UserProfile.failed_login_attempts, UserProfile.account_locked_until)
+            .where(UserProfile.id == test_user.id)
+        )
+        failed_login_attempts, account_locked_until = result.one()
+        if failed_login_attempts >= settings.MAX_LOGIN_ATTEMPTS:
+            assert account_locked_until is not None
+            assert account_locked_until > datetime.utcnow()
     
     @pytest.mark.asyncio
-    async def test_session_hijacking_prevention(self, db_session, test_user):
+    async def test_session_hijacking_prevention(self, db_session, authenticated_tokens):
         """Test session security measures"""
         auth_service = AuthenticationService(db_session)
         
-        device1 = DeviceInfo(
-            ip_address="192.168.1.100",
-            user_agent="Browser 1",
-            fingerprint="device_1"
-        )
-        
         device2 = DeviceInfo(
             ip_address="192.168.1.200",
             user_agent="Browser 2", 
             fingerprint="device_2"
         )
         
-        # Login from device 1
-        login_request = LoginRequest(
-            email=test_user.email,
-            password="SecurePassword123!"
-        )
-        
-        result1 = await auth_service.authenticate_user(login_request, device1)
-        assert result1.success is True
-        
-        # Try to use refresh token from different device
+        # Try to use refresh token (issued to device_info) from different device
         refresh_result = await auth_service.refresh_access_token(
-            result1.tokens.refresh_token,
+            authenticated_tokens.refresh_token,
             device2
         )
         
         # Should fail due to device fingerprint mismatch
         assert refresh_result is None
     
-    @pytest.mark.asyncio
-    async def test_jwt_token_security(self, test_user):
+    def test_jwt_token_security(self, token_subject):
         """Test JWT token security properties"""
         permissions = ["invoice:read", "user:manage"]
         
         # Test token creation
         token = security.create_access_token(
-            user_id=test_user.id,
-            tenant_id=test_user.tenant_id,
+            user_id=token_subject.id,
+            tenant_id=token_subject.tenant_id,
             permissions=permissions
         )
         
-        # Decode token to inspect claims
+        # Test token verification
+        payload = security.verify_token(token)
+        assert payload is not None
+        assert payload.sub == str(token_subject.id)
+        
+        # verify_token hands back a typed payload rather than the raw claims,
+        # so decode once more, unverified, to inspect the registered claims
         decoded = jwt.decode(token, options={"verify_signature": False})
         
-        # Verify required claims are present
-        assert "sub" in decoded  # Subject (user ID)
-        assert "tenant_id" in decoded
-        assert "permissions" in decoded
-        assert "exp" in decoded  # Expiration
-        assert "iat" in decoded  # Issued at
-        assert "jti" in decoded  # JWT ID
-        assert "type" in decoded  # Token type
+        # Verify required claims are present: subject (user ID), expiration,
+        # issued at, JWT ID and token type alongside the app's own claims
+        required_claims = {"sub", "tenant_id", "permissions", "exp", "iat", "jti", "type"}
+        assert required_claims <= decoded.keys(), required_claims - decoded.keys()
         
         # Verify token has expiration
         exp = decoded["exp"]
@@ -255,70 +413,100 @@ class TestAuthenticationSecurity:
         expiry_duration = exp - iat
         assert expiry_duration <= settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
         
-        # Test token verification
-        payload = security.verify_token(token)
-        assert payload is not None
-        assert payload.sub == str(test_user.id)
-        
         # Test tampered token detection
         tampered_token = token[:-10] + "tampered"
         tampered_payload = security.verify_token(tampered_token)
         assert tampered_payload is None
     
+    def test_token_signature_constant_time(self, token_subject):
+        """Test signature checks take as long for an early mismatch as a late one"""
+        token = security.create_access_token(
+            user_id=token_subject.id,
+            tenant_id=token_subject.tenant_id,
+            permissions=["invoice:read"]
+        )
+        
+        # A short-circuiting == on the signature returns sooner when the first
+        # byte differs than when only the last does; hmac.compare_digest doesn't
+        early_mismatch = _tamper_signature(token, 0)
+        late_mismatch = _tamper_signature(token, -1)
+        assert security.verify_token(early_mismatch) is None
+        assert security.verify_token(late_mismatch) is None
+        
+        # Interleave the samples so drift affects both sides equally
+        early_times = []
+        late_times = []
+        for _ in range(200):
+            start_time = time.perf_counter_ns()
+            security.verify_token(early_mismatch)
+            early_times.append(time.perf_counter_ns() - start_time)
+            
+            start_time = time.perf_counter_ns()
+            security.verify_token(late_mismatch)
+            late_times.append(time.perf_counter_ns() - start_time)
+        
+        time_difference_ns = abs(statistics.median(early_times) - statistics.median(late_times))
+        
+        print(f"Median early-mismatch verify: {statistics.median(early_times) / 1000:.1f}us")
+        print(f"Median late-mismatch verify: {statistics.median(late_times) / 1000:.1f}us")
+        
+        # Less than 100us apart
+        assert time_difference_ns < 100_000
+    
     @pytest.mark.asyncio
     async def test_password_reset_security(self, db_session, test_user, device_info):
         """Test password reset security measures"""
+        now = datetime.utcnow()
+        
+        # Test token uniqueness (generate multiple tokens); only persisted
+        # tokens need hashing, so none of these are hashed
+        tokens = set()
+        for _ in range(100):
+            token = security.generate_secure_token(32)
+            tokens.add(token)
+        
+        assert len(tokens) == 100  # All tokens should be unique
+        
         # Create password reset token
         reset_token = security.generate_secure_token(32)
         token_hash = security.hash_password(reset_token)
         
+        # Test token characteristics
+        assert len(reset_token) >= 32  # Should be sufficiently long
+        assert reset_token != token_hash  # Should be hashed in storage
+        
         reset_record = PasswordResetToken(
             user_id=test_user.id,
             tenant_id=test_user.tenant_id,
             token_hash=token_hash,
-            expires_at=datetime.utcnow() + timedelta(minutes=30),
+            expires_at=now + timedelta(minutes=30),
             requested_ip=device_info.ip_address,
             requested_user_agent=device_info.user_agent
         )
         
-        db_session.add(reset_record)
-        await db_session.commit()
-        
-        # Test token characteristics
-        assert len(reset_token) >= 32  # Should be sufficiently long
-        assert reset_token != token_hash  # Should be hashed in storage
-        
-        # Test token uniqueness (generate multiple tokens)
-        tokens = set()
-        for _ in range(100):
-            token = security.generate_secure_token(32)
-            tokens.add(token)
-        
-        assert len(tokens) == 100  # All tokens should be unique
-        
         # Test token expiration
         expired_record = PasswordResetToken(
             user_id=test_user.id,
             tenant_id=test_user.tenant_id,
             token_hash=security.hash_password("expired_token"),
-            expires_at=datetime.utcnow() - timedelta(minutes=1),  # Expired
+            expires_at=now - timedelta(minutes=1),  # Expired
             requested_ip=device_info.ip_address
         )
         
-        db_session.add(expired_record)
+        db_session.add_all([reset_record, expired_record])
         await db_session.commit()
         
         # Expired token should not be usable
         result = await db_session.execute(
-            select(PasswordResetToken).where(
+            select(func.count()).select_from(PasswordResetToken).where(
                 PasswordResetToken.user_id == test_user.id,
-                PasswordResetToken.used_at == None,
-                PasswordResetToken.expires_at > datetime.utcnow()
+                PasswordResetToken.used_at.is_(None),
+                PasswordResetToken.expires_at > now
             )
         )
         
-        valid_tokens = result.scalars().all()
-        assert len(valid_tokens) == 1  # Only the non-expired token
+        valid_token_count = result.scalar_one()
+        assert valid_token_count == 1  # Only the non-expired token
     
     @pytest.mark.asyncio
     async def test_mfa_security(self, db_session, test_user):
@@ -337,15 +525,18 @@ class TestAuthenticationSecurity:
         backup_codes = mfa_result.backup_codes
         assert len(backup_codes) == settings.MFA_BACKUP_CODES_COUNT
         
+        # Check format and uniqueness in one pass
+        seen_codes = set()
         for code in backup_codes:
             # Should be in format ####-####
             assert len(code) == 9
             assert code[4] == '-'
             assert code[:4].isdigit()
             assert code[5:].isdigit()
-        
-        # Test backup code uniqueness
-        assert len(set(backup_codes)) == len(backup_codes)
+            
+            # Test backup code uniqueness
+            assert code not in seen_codes, f"Duplicate backup code {code}"
+            seen_codes.add(code)
         
         # Test TOTP time window
         import pyotp
@@ -376,7 +567,7 @@ class TestAuthenticationSecurity:
         await auth_service.authenticate_user(login_request, device_info)
         
         # Successful login
-        login_request.password = "SecurePassword123!"
+        login_request.password = _PASSWORD
         result = await auth_service.authenticate_user(login_request, device_info)
         
         # Check audit logs
@@ -419,7 +610,7 @@ class TestAuthenticationSecurity:
         # This prevents email enumeration attacks
     
     @pytest.mark.asyncio
-    async def test_rate_limiting_bypass_attempts(self, db_session, test_user):
+    async def test_rate_limiting_bypass_attempts(self, db_session, test_user, redis_connection):
         """Test various rate limiting bypass attempts"""
         auth_service = AuthenticationService(db_session)
         
@@ -438,19 +629,31 @@ class TestAuthenticationSecurity:
                 fingerprint=f"device_{ip}"
             )
             
-            # Each IP should have its own rate limit
             result = await auth_service.authenticate_user(login_request, device_info)
             
-            # First attempt from each IP should not be rate limited
-            # (unless account is locked)
-            if "locked" not in result.error.lower():
-                assert "too many" not in result.error.lower()
+            # First attempt from each IP should not be rate limited (the
+            # account itself may lock after repeated wrong passwords)
+            assert result.success is False
+            assert result.error_code in (
+                AuthErrorCode.INVALID_CREDENTIALS,
+                AuthErrorCode.ACCOUNT_LOCKED
+            )
+        
+        # Each IP should have its own rate limit: every window admitted exactly
+        # its first attempt. Read them all back in a single round trip.
+        prefix = redis_service.key_prefix
+        async with redis_service.redis_client.pipeline(transaction=False) as pipe:
+            for ip in different_ips:
+                pipe.zcard(f"{prefix}rate_limit:login_ip:{ip}")
+            ip_counts = await pipe.execute()
+        
+        assert ip_counts == [1] * len(different_ips)
         
         # Test email-based rate limiting (should persist across IPs)
-        await redis_service.client.delete(f"login_email:{test_user.email}")
+        await _clear_login_limits([test_user.email], [f"10.0.0.{i}" for i in range(15)])
         
         # Multiple attempts with same email but different IPs
-        attempts = 0
+        results = []
         for i in range(15):
             device_info = DeviceInfo(
                 ip_address=f"10.0.0.{i}",
@@ -458,17 +661,20 @@ class TestAuthenticationSecurity:
                 fingerprint=f"bypass_device_{i}"
             )
             
-            result = await auth_service.authenticate_user(login_request, device_info)
-            
-            if "too many" in result.error.lower():
-                break
-            attempts += 1
+            results.append(await auth_service.authenticate_user(login_request, device_info))
         
-        # Should be rate limited by email even with different IPs
-        assert attempts <= 10  # Email rate limiting should kick in
+        # Should be rate limited by email even with different IPs: the first
+        # 10 attempts are admitted and every one after that is rejected
+        rate_limited = [result.error_code == AuthErrorCode.RATE_LIMITED for result in results]
+        assert rate_limited == [False] * 10 + [True] * 5
+        
+        # Rejected attempts are never recorded, so the window holds exactly
+        # the admitted ones
+        attempts = await redis_service.redis_client.zcard(f"{prefix}rate_limit:login_email:{test_user.email}")
+        assert attempts == 10
     
-    @pytest.mark.asyncio 
-    async def test_cryptographic_security(self):
+    @pytest.mark.slow
+    def test_cryptographic_security(self):
         """Test cryptographic security of passwords and tokens"""
         # Test password hashing
         password = "TestPassword123!"
@@ -478,46 +684,46 @@ class TestAuthenticationSecurity:
         # Same password should produce different hashes (salt)
         assert hash1 != hash2
         
-        # Both hashes should verify correctly
+        # A salted hash should still verify; hash2 comes from the same code
+        # path, so checking it too would only repeat the bcrypt work
         assert security.verify_password(password, hash1)
-        assert security.verify_password(password, hash2)
         
         # Test secure token generation
-        tokens = set()
-        for _ in range(1000):
-            token = security.generate_secure_token(32)
-            tokens.add(token)
+        tokens = [security.generate_secure_token(32) for _ in range(1000)]
         
         # All tokens should be unique (cryptographically secure randomness)
-        assert len(tokens) == 1000
-        
-        # Test token entropy
-        token = security.generate_secure_token(32)
-        token_bytes = token.encode()
-        
-        # Should have good entropy (rough check)
-        unique_chars = len(set(token))
-        assert unique_chars > len(token) * 0.5  # At least 50% unique characters
+        assert len(set(tokens)) == 1000
+        
+        # Test token entropy: symbols should be spread evenly over the alphabet.
+        # Each token's last character is dropped because base64 packs leftover
+        # padding bits into it, which legitimately skews its distribution.
+        symbols = np.frombuffer("".join(token[:-1] for token in tokens).encode(), dtype=np.uint8)
+        _, counts = np.unique(symbols, return_counts=True)
+        expected = counts.mean()
+        chi_squared = ((counts - expected) ** 2 / expected).sum()
+        
+        # Chi-squared has mean df and variance 2*df under uniformity; six
+        # standard deviations keeps false failures negligible
+        degrees_of_freedom = len(counts) - 1
+        assert chi_squared < degrees_of_freedom + 6 * (2 * degrees_of_freedom) ** 0.5, (
+            f"Token symbols are unevenly distributed (chi-squared {chi_squared:.1f}, df {degrees_of_freedom})"
+        )
     
     @pytest.mark.asyncio
-    async def test_session_fixation_prevention(self, db_session, test_user, device_info):
+    async def test_session_fixation_prevention(self, db_session, test_user, device_info, authenticated_tokens):
         """Test prevention of session fixation attacks"""
         auth_service = AuthenticationService(db_session)
         
-        # Login to create session
-        login_request = LoginRequest(
-            email=test_user.email,
-            password="SecurePassword123!"
-        )
-        
-        result1 = await auth_service.authenticate_user(login_request, device_info)
-        assert result1.success is True
+        # Start from an existing session
+        token1 = authenticated_tokens.access_token
         
-        token1 = result1.tokens.access_token
-        
-        # Logout and login again
+        # Logout and login again; the logout is rolled back with the test
         await auth_service.logout_user(token1, device_info)
         
+        login_request = LoginRequest(
+            email=test_user.email,
+            password=_PASSWORD
+        )
         result2 = await auth_service.authenticate_user(login_request, device_info)
         assert result2.success is True
         
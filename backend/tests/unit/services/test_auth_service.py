@@ -5,52 +5,180 @@ Comprehensive test coverage for authentication, MFA, and security features
 
 import pytest
 import asyncio
+import itertools
 from datetime import datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
-from uuid import uuid4
+from uuid import UUID
 
 from app.services.auth_service import (
-    AuthenticationService, LoginRequest, LoginResult, 
+    AuthenticationService, AuthErrorCode, LoginRequest, LoginResult, 
     DeviceInfo, MFASetupResult
 )
 from app.models.auth import UserProfile
 from app.core.security import security
 
 
+# Fixed identities and clock for the fixtures, so runs are reproducible
+_TEST_USER_ID = UUID("00000000-0000-0000-0000-000000000001")
+_TEST_TENANT_ID = UUID("00000000-0000-0000-0000-000000000002")
+_TEST_NOW = datetime(2024, 1, 15, 12, 0, 0)
+
+# Counter-backed ids for tests that need values distinct from the above
+_id_counter = itertools.count(0x100)
+
+
+def _next_id() -> UUID:
+    """Return a fresh, deterministic UUID"""
+    return UUID(int=next(_id_counter))
+
+
+# Internal steps of authenticate_user that the service tests stub out, with
+# the happy-path value each returns unless a test overrides it
+_SERVICE_MOCK_DEFAULTS = {
+    "_get_user_by_email": None,
+    "_check_rate_limit": True,
+    "_is_account_locked": False,
+    "_create_user_session": "session_123",
+    "_get_user_permissions": ["invoice:read"],
+    "_update_successful_login": None,
+    "_is_trusted_device": False,
+    "_log_auth_attempt": None,
+    "_handle_failed_login": None,
+    "_verify_mfa_token": True,
+}
+
+
+# authenticate_user outcomes: stub return values to override, request fields
+# to change, and what the result should look like
+_AUTHENTICATE_CASES = [
+    pytest.param(
+        dict(success=True, called=("check_rate_limit", "update_successful_login")),
+        id="success"
+    ),
+    pytest.param(
+        dict(
+            request={"password": "wrong_password"},
+            success=False,
+            error="invalid email or password",
+            error_code=AuthErrorCode.INVALID_CREDENTIALS,
+            called=("handle_failed_login",)
+        ),
+        id="invalid_password"
+    ),
+    pytest.param(
+        dict(
+            stubs={"is_account_locked": True},
+            success=False,
+            error="locked",
+            error_code=AuthErrorCode.ACCOUNT_LOCKED
+        ),
+        id="account_locked"
+    ),
+    pytest.param(
+        dict(
+            stubs={"check_rate_limit": False},
+            success=False,
+            error="too many",
+            error_code=AuthErrorCode.RATE_LIMITED
+        ),
+        id="rate_limited"
+    ),
+    pytest.param(
+        dict(
+            mfa_enabled=True,
+            success=False,
+            requires_mfa=True,
+            mfa_methods=["totp"]
+        ),
+        id="mfa_required"
+    ),
+    pytest.param(
+        dict(
+            mfa_enabled=True,
+            request={"mfa_token": "123456"},  # Would be valid TOTP in real scenario
+            success=True,
+            called=("verify_mfa_token",)
+        ),
+        id="valid_mfa"
+    ),
+]
+
+
 class TestAuthenticationService:
     """Test cases for AuthenticationService"""
     
-    @pytest.fixture
-    def mock_db(self):
-        """Mock database session"""
+    @pytest.fixture(scope="class")
+    def event_loop(self):
+        """One event loop for the whole class; the tests only await mocks"""
+        loop = asyncio.new_event_loop()
+        yield loop
+        loop.close()
+    
+    @pytest.fixture(scope="class", autouse=True)
+    def dummy_hasher(self):
+        """Swap bcrypt for a trivial hasher; these tests never check hash strength"""
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(security, "hash_password", lambda password: f"dummy${password}")
+            mp.setattr(
+                security,
+                "verify_password",
+                lambda password, hashed: hashed == f"dummy${password}"
+            )
+            yield
+    
+    @pytest.fixture(scope="module")
+    def auth_service_template(self):
+        """Service wired to a mock database and stubbed steps, built once per module"""
         mock_db = AsyncMock()
         mock_db.execute = AsyncMock()
         mock_db.commit = AsyncMock()
         mock_db.add = MagicMock()
-        return mock_db
+        
+        service = AuthenticationService(mock_db)
+        for name in _SERVICE_MOCK_DEFAULTS:
+            setattr(service, name, AsyncMock())
+        
+        return service, dict(vars(service))
     
     @pytest.fixture
-    def auth_service(self, mock_db):
-        """Create authentication service instance"""
-        return AuthenticationService(mock_db)
+    def auth_service(self, auth_service_template):
+        """The shared service, returned to its template state for this test"""
+        service, attributes = auth_service_template
+        
+        # Drop anything a previous test swapped in, then clear call history
+        # and restore the default results
+        vars(service).clear()
+        vars(service).update(attributes)
+        service.db.reset_mock()
+        for name, return_value in _SERVICE_MOCK_DEFAULTS.items():
+            stub = getattr(service, name)
+            stub.reset_mock(return_value=True, side_effect=True)
+            stub.return_value = return_value
+        
+        return service
+    
+    @pytest.fixture(scope="class")
+    def password_hash(self, dummy_hasher):
+        """Hash of the sample password, computed once for the class"""
+        return security.hash_password("password123")
     
     @pytest.fixture
-    def sample_user(self):
+    def sample_user(self, password_hash):
         """Sample user profile for testing"""
         return UserProfile(
-            id=uuid4(),
-            tenant_id=uuid4(),
+            id=_TEST_USER_ID,
+            tenant_id=_TEST_TENANT_ID,
             email="test@example.com",
-            password_hash=security.hash_password("password123"),
+            password_hash=password_hash,
             full_name="Test User",
             auth_status="active",
             mfa_enabled=False,
             failed_login_attempts=0,
             account_locked_until=None,
-            created_at=datetime.utcnow()
+            created_at=_TEST_NOW
         )
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def sample_device_info(self):
         """Sample device information"""
         return DeviceInfo(
@@ -60,9 +188,9 @@ class TestAuthenticationService:
             fingerprint="test_fingerprint_123"
         )
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def login_request(self):
-        """Sample login request"""
+        """Sample login request; shared, so tests vary it with model_copy"""
         return LoginRequest(
             email="test@example.com",
             password="password123",
@@ -71,145 +199,41 @@ class TestAuthenticationService:
         )
 
     @pytest.mark.asyncio
-    async def test_authenticate_user_success(
-        self, auth_service, sample_user, sample_device_info, login_request
-    ):
-        """Test successful user authentication"""
-        # Mock database queries
-        auth_service._get_user_by_email = AsyncMock(return_value=sample_user)
-        auth_service._check_rate_limit = AsyncMock(return_value=True)
-        auth_service._is_account_locked = AsyncMock(return_value=False)
-        auth_service._create_user_session = AsyncMock(return_value="session_123")
-        auth_service._get_user_permissions = AsyncMock(return_value=["invoice:read"])
-        auth_service._update_successful_login = AsyncMock()
-        auth_service._is_trusted_device = AsyncMock(return_value=False)
-        auth_service._log_auth_attempt = AsyncMock()
-        
-        # Execute authentication
-        result = await auth_service.authenticate_user(login_request, sample_device_info)
-        
-        # Assertions
-        assert result.success is True
-        assert result.tokens is not None
-        assert result.user_id == str(sample_user.id)
-        assert result.tenant_id == str(sample_user.tenant_id)
-        assert result.requires_mfa is False
-        
-        # Verify method calls
-        auth_service._check_rate_limit.assert_called_once()
-        auth_service._get_user_by_email.assert_called_once_with(login_request.email)
-        auth_service._update_successful_login.assert_called_once()
-
-    @pytest.mark.asyncio
-    async def test_authenticate_user_invalid_password(
-        self, auth_service, sample_user, sample_device_info, login_request
-    ):
-        """Test authentication with invalid password"""
-        # Set wrong password
-        login_request.password = "wrong_password"
-        
-        # Mock database queries
-        auth_service._get_user_by_email = AsyncMock(return_value=sample_user)
-        auth_service._check_rate_limit = AsyncMock(return_value=True)
-        auth_service._is_account_locked = AsyncMock(return_value=False)
-        auth_service._handle_failed_login = AsyncMock()
-        
-        # Execute authentication
-        result = await auth_service.authenticate_user(login_request, sample_device_info)
-        
-        # Assertions
-        assert result.success is False
-        assert result.error == "Invalid email or password."
-        
-        # Verify failed login handling
-        auth_service._handle_failed_login.assert_called_once()
-
-    @pytest.mark.asyncio
-    async def test_authenticate_user_account_locked(
-        self, auth_service, sample_user, sample_device_info, login_request
-    ):
-        """Test authentication with locked account"""
-        # Mock database queries
-        auth_service._get_user_by_email = AsyncMock(return_value=sample_user)
-        auth_service._check_rate_limit = AsyncMock(return_value=True)
-        auth_service._is_account_locked = AsyncMock(return_value=True)
-        auth_service._log_auth_attempt = AsyncMock()
-        
-        # Execute authentication
-        result = await auth_service.authenticate_user(login_request, sample_device_info)
-        
-        # Assertions
-        assert result.success is False
-        assert "locked" in result.error.lower()
-
-    @pytest.mark.asyncio
-    async def test_authenticate_user_rate_limited(
-        self, auth_service, sample_device_info, login_request
-    ):
-        """Test authentication with rate limiting"""
-        # Mock rate limit check
-        auth_service._check_rate_limit = AsyncMock(return_value=False)
-        auth_service._log_auth_attempt = AsyncMock()
-        
-        # Execute authentication
-        result = await auth_service.authenticate_user(login_request, sample_device_info)
-        
-        # Assertions
-        assert result.success is False
-        assert "too many" in result.error.lower()
-
-    @pytest.mark.asyncio
-    async def test_authenticate_user_mfa_required(
-        self, auth_service, sample_user, sample_device_info, login_request
+    @pytest.mark.parametrize("case", _AUTHENTICATE_CASES)
+    async def test_authenticate_user(
+        self, auth_service, sample_user, sample_device_info, login_request, case
     ):
-        """Test authentication requiring MFA"""
-        # Enable MFA for user
-        sample_user.mfa_enabled = True
-        sample_user.mfa_secret = "JBSWY3DPEHPK3PXP"
+        """Test each authentication outcome against the stubbed internals"""
+        if case.get("mfa_enabled"):
+            sample_user.mfa_enabled = True
+            sample_user.mfa_secret = "JBSWY3DPEHPK3PXP"
+        login_request = login_request.model_copy(update=case.get("request", {}))
         
-        # Mock database queries
-        auth_service._get_user_by_email = AsyncMock(return_value=sample_user)
-        auth_service._check_rate_limit = AsyncMock(return_value=True)
-        auth_service._is_account_locked = AsyncMock(return_value=False)
-        
-        # Execute authentication without MFA token
-        result = await auth_service.authenticate_user(login_request, sample_device_info)
-        
-        # Assertions
-        assert result.success is False
-        assert result.requires_mfa is True
-        assert result.mfa_methods == ['totp']
-
-    @pytest.mark.asyncio
-    async def test_authenticate_user_with_valid_mfa(
-        self, auth_service, sample_user, sample_device_info, login_request
-    ):
-        """Test successful authentication with MFA"""
-        # Enable MFA for user
-        sample_user.mfa_enabled = True
-        sample_user.mfa_secret = "JBSWY3DPEHPK3PXP"
-        login_request.mfa_token = "123456"  # Would be valid TOTP in real scenario
-        
-        # Mock database queries and MFA verification
-        auth_service._get_user_by_email = AsyncMock(return_value=sample_user)
-        auth_service._check_rate_limit = AsyncMock(return_value=True)
-        auth_service._is_account_locked = AsyncMock(return_value=False)
-        auth_service._verify_mfa_token = AsyncMock(return_value=True)
-        auth_service._create_user_session = AsyncMock(return_value="session_123")
-        auth_service._get_user_permissions = AsyncMock(return_value=["invoice:read"])
-        auth_service._update_successful_login = AsyncMock()
-        auth_service._is_trusted_device = AsyncMock(return_value=False)
-        auth_service._log_auth_attempt = AsyncMock()
+        # Mock database queries; anything else keeps its happy-path default
+        auth_service._get_user_by_email.return_value = sample_user
+        for name, return_value in case.get("stubs", {}).items():
+            getattr(auth_service, f"_{name}").return_value = return_value
         
         # Execute authentication
         result = await auth_service.authenticate_user(login_request, sample_device_info)
         
         # Assertions
-        assert result.success is True
-        assert result.tokens is not None
+        assert result.success is case["success"]
+        assert result.error_code == case.get("error_code")
+        assert case.get("error", "") in (result.error or "").lower()
+        assert result.requires_mfa is case.get("requires_mfa", False)
+        if "mfa_methods" in case:
+            assert result.mfa_methods == case["mfa_methods"]
+        
+        if result.success:
+            assert result.tokens is not None
+            assert result.user_id == str(sample_user.id)
+            assert result.tenant_id == str(sample_user.tenant_id)
+            auth_service._get_user_by_email.assert_called_once_with(login_request.email)
         
-        # Verify MFA verification was called
-        auth_service._verify_mfa_token.assert_called_once()
+        # Verify method calls
+        for name in case.get("called", ()):
+            getattr(auth_service, f"_{name}").assert_called_once()
 
     @pytest.mark.asyncio
     async def test_setup_mfa(self, auth_service, sample_user):
@@ -244,9 +268,8 @@ class TestAuthenticationService:
         # Setup MFA secret
         sample_user.mfa_secret = "JBSWY3DPEHPK3PXP"
         
-        # Mock database operations
+        # Mock database operations; MFA verification passes by default
         auth_service._get_user_by_id = AsyncMock(return_value=sample_user)
-        auth_service._verify_mfa_token = AsyncMock(return_value=True)
         auth_service.db.execute = AsyncMock()
         auth_service.db.commit = AsyncMock()
         
@@ -271,14 +294,14 @@ class TestAuthenticationService:
         """Test access token refresh"""
         # Mock token payload
         mock_session = MagicMock()
-        mock_session.user_id = uuid4()
-        mock_session.id = uuid4()
+        mock_session.user_id = _next_id()
+        mock_session.id = _next_id()
         
         with patch('app.core.security.security.verify_token') as mock_verify:
             mock_payload = MagicMock()
             mock_payload.type = "refresh"
             mock_payload.sub = str(mock_session.user_id)
-            mock_payload.tenant_id = str(uuid4())
+            mock_payload.tenant_id = str(_next_id())
             mock_payload.session_id = str(mock_session.id)
             mock_payload.device_id = "test_device"
             mock_verify.return_value = mock_payload
@@ -305,8 +328,8 @@ class TestAuthenticationService:
         # Mock token verification and session termination
         with patch('app.core.security.security.verify_token') as mock_verify:
             mock_payload = MagicMock()
-            mock_payload.sub = str(uuid4())
-            mock_payload.tenant_id = str(uuid4())
+            mock_payload.sub = str(_next_id())
+            mock_payload.tenant_id = str(_next_id())
             mock_payload.session_id = "session_123"
             mock_verify.return_value = mock_payload
             
@@ -353,8 +376,8 @@ class TestAuthenticationService:
 
     def test_jwt_token_operations(self):
         """Test JWT token creation and verification"""
-        user_id = uuid4()
-        tenant_id = uuid4()
+        user_id = _next_id()
+        tenant_id = _next_id()
         permissions = ["invoice:read", "vendor:manage"]
         
         # Create access token
@@ -375,21 +398,6 @@ class TestAuthenticationService:
         assert payload.permissions == permissions
         assert payload.type == "access"
 
-    def test_password_hashing(self):
-        """Test password hashing and verification"""
-        password = "test_password_123"
-        
-        # Hash password
-        hashed = security.hash_password(password)
-        assert hashed != password
-        assert len(hashed) > 50  # bcrypt hashes are long
-        
-        # Verify correct password
-        assert security.verify_password(password, hashed) is True
-        
-        # Verify incorrect password
-        assert security.verify_password("wrong_password", hashed) is False
-
     def test_backup_code_generation(self):
         """Test MFA backup code generation"""
         codes = security.generate_backup_codes(10)
@@ -412,6 +420,25 @@ class TestAuthenticationService:
         assert security.verify_backup_code("0000-0000", hashed_codes) is False
 
 
+class TestPasswordHashing:
+    """Password hashing against real bcrypt, outside the dummy hasher"""
+    
+    def test_password_hashing(self):
+        """Test password hashing and verification"""
+        password = "test_password_123"
+        
+        # Hash password
+        hashed = security.hash_password(password)
+        assert hashed != password
+        assert len(hashed) > 50  # bcrypt hashes are long
+        
+        # Verify correct password
+        assert security.verify_password(password, hashed) is True
+        
+        # Verify incorrect password
+        assert security.verify_password("wrong_password", hashed) is False
+
+
 @pytest.mark.integration
 class TestAuthenticationIntegration:
     """Integration tests for authentication system"""